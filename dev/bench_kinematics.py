@@ -0,0 +1,86 @@
+'''
+Benchmark: per-frame python kinematics (previous readDLCfiles / find_good_frames) vs vectorized src/lib/kinematics
+
+- python dev/bench_kinematics.py --frames 100000
+'''
+
+import argparse
+import math
+import sys
+from pathlib import Path
+from timeit import default_timer as timer
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.lib import kinematics
+
+
+def smooth_legacy(arr, span):
+    re = np.convolve(arr, np.ones(span * 2 + 1) / (span * 2 + 1), mode="same")
+    re[0] = np.average(arr[:span])
+    for i in range(1, span + 1):
+        re[i] = np.average(arr[:i + span])
+        re[-i] = np.average(arr[-i - span:])
+    return re
+
+
+def kinematics_legacy(df, smoothingwin=5):
+    x1 = smooth_legacy(df.Nosex, smoothingwin)
+    y1 = smooth_legacy(df.Nosey, smoothingwin)
+    x2 = smooth_legacy(df.Snoutx1, smoothingwin)
+    y2 = smooth_legacy(df.Snouty1, smoothingwin)
+    head_angles = [math.atan2(-(y1[i]-y2[i]),-(x1[i]-x2[i])) for i in range(len(df.Snoutlikelihood))]
+    inter_bead_distance = [math.sqrt((x2[i] - x1[i])**2 + (y2[i] - y1[i])**2) for i in range(len(df.Snoutlikelihood))]
+    Good_Frames = [0 if df.Noselikelihood[i] <0.7 or df.Snoutlikelihood[i] <0.7 or inter_bead_distance[i]<5 or inter_bead_distance[i]>200 else 1 for i in range(len(df.Snoutlikelihood))]
+    return x1, np.array(head_angles), np.array(inter_bead_distance), np.array(Good_Frames) == 1
+
+
+def kinematics_vectorized(df, smoothingwin=5):
+    x1 = kinematics.smooth_data_convolve_my_average(df.Nosex, smoothingwin)
+    head_angles, inter_bead_distance = kinematics.compute_kinematics(df, smoothingwin)
+    good = kinematics.good_frame_mask(df.Noselikelihood, df.Snoutlikelihood, inter_bead_distance, 0.7, 5, 200)
+    return x1, head_angles, inter_bead_distance, good
+
+
+def synthetic_dlc(frames, seed=0):
+    rng = np.random.default_rng(seed)
+    nose = np.cumsum(rng.normal(0, 2, (frames, 2)), axis=0) + 400
+    snout = nose + rng.normal(0, 40, (frames, 2))
+    return pd.DataFrame({
+        'Nosex': nose[:, 0], 'Nosey': nose[:, 1], 'Noselikelihood': rng.uniform(0.5, 1, frames),
+        'Snoutx1': snout[:, 0], 'Snouty1': snout[:, 1], 'Snoutlikelihood': rng.uniform(0.5, 1, frames),
+    })
+
+
+def best_of(function, df, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = timer()
+        result = function(df)
+        best = min(best, timer() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='kinematics benchmark')
+    parser.add_argument('--frames', type=int, default=100000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_dlc(args.frames)
+    legacy_time, legacy = best_of(kinematics_legacy, df, args.repeats)
+    vectorized_time, vectorized = best_of(kinematics_vectorized, df, args.repeats)
+
+    print(f'frames: {args.frames}')
+    print(f'legacy:     {legacy_time:.4f} s')
+    print(f'vectorized: {vectorized_time:.4f} s  (speedup x{legacy_time / vectorized_time:.1f})')
+    print(f'smoothing bit-identical:  {np.array_equal(legacy[0], vectorized[0])}')
+    print(f'head angle max abs diff:  {np.abs(legacy[1] - vectorized[1]).max():.3g}')
+    print(f'distance max abs diff:    {np.abs(legacy[2] - vectorized[2]).max():.3g}')
+    print(f'good frames identical:    {np.array_equal(legacy[3], vectorized[3])}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+'''
+Benchmark session discovery (read_metadata_status_files) on a generated tree: animals x sessions x trial folders
+(some sessions already processed); cold run (no discovery cache, no status.json/meta-data.json) per worker count,
+results compared to serial (workers=1). --latency-ms adds a delay per stat/listing call to mimic NFS round trips
+
+- python dev/bench_session_discovery.py --animals 40 --sessions 100 --trials 5 --latency-ms 2 --workers 1 8 16 32
+'''
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from timeit import default_timer as timer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.lib import session_discovery
+from src.lib.file_logger import FileLogger
+from src.lib.session_discovery import SessionDiscovery
+
+
+def make_tree(base: Path, animals: int, sessions: int, trials: int, processed: float = 0.5):
+    for animal in range(animals):
+        for session in range(sessions):
+            session_folder = Path(base, f'animal{animal:03d}', f'session{session:04d}')
+            for trial in range(trials):
+                Path(session_folder, str(trial)).mkdir(parents=True)
+            if session < sessions * processed:
+                Path(session_folder, 'meta-data.json').write_text('{"folders": [], "last_task": "all_done"}')
+
+
+def add_latency(latency: float):
+    '''
+    Delay per filesystem call of session_discovery (stat, scandir)
+    '''
+    for name in ['list_subfolders', 'mtime_ns', 'file_stat']:
+        function = getattr(session_discovery, name)
+        def delayed(*args, function=function):
+            time.sleep(latency)
+            return function(*args)
+        setattr(session_discovery, name, delayed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='session discovery benchmark')
+    parser.add_argument('--animals', type=int, default=40)
+    parser.add_argument('--sessions', type=int, default=100, help='sessions per animal')
+    parser.add_argument('--trials', type=int, default=5, help='trial folders per session')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='added delay per stat/listing call')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 32])
+    args = parser.parse_args()
+
+    if args.latency_ms:
+        add_latency(args.latency_ms / 1000)
+    workdir = Path(tempfile.mkdtemp(prefix='bench_discovery_'))
+    file_logger = FileLogger(str(Path(workdir, 'bench.log')))
+    reference = None
+    try:
+        for workers in args.workers:
+            base = Path(workdir, f'tree{workers}')
+            make_tree(base, args.animals, args.sessions, args.trials)
+            discovery = SessionDiscovery(file_logger, base, cache_file=Path(workdir, f'cache{workers}.json'), workers=workers)
+            start = timer()
+            result = discovery.run()
+            cold = timer() - start
+            discovery = SessionDiscovery(file_logger, base, cache_file=Path(workdir, f'cache{workers}.json'), workers=workers)
+            start = timer()
+            discovery.run()
+            warm = timer() - start
+            reference = result if reference is None else reference
+            same = 'same' if result == reference else 'DIFFERENT'
+            print(f'workers {workers:3d}: cold {cold:8.2f} s, warm {warm:8.2f} s '
+                  f'({args.animals * args.sessions} sessions, {sum(map(len, result.values()))} to process; {same} as workers {args.workers[0]})')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
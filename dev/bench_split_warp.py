@@ -0,0 +1,81 @@
+'''
+Benchmark: previous rotate/crop chain of process_and_split_video (BGR->RGB, PIL rotate(expand=True), add_margin 400px,
+crop_rotated, column slice, flip) vs single cv2.warpAffine (image_util.warp_split); frames per second before/after
+
+- python dev/bench_split_warp.py --frames 200 --height 600 --width 800
+'''
+
+import argparse
+import math
+import sys
+from pathlib import Path
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.lib import image_util
+
+
+def split_legacy(frame, head_angle, df, i, start_index, end_index, faceshift, flip):
+    color_coverted = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    image = Image.fromarray(color_coverted)
+    rotated = image.rotate((math.degrees(head_angle[i])-90+180), expand=True)
+    rotated = np.array(rotated)
+    rotated = rotated[:, :, ::-1].copy()
+    cropped = image_util.crop_rotated(rotated, frame, head_angle, i, df)
+    cropped_image = cropped[0:700, start_index+faceshift:end_index+faceshift]
+    return cv2.flip(cropped_image, 1) if flip else cropped_image
+
+
+def split_warp(frame, head_angle, df, i, start_index, end_index, faceshift, flip):
+    angle = math.degrees(head_angle[i])-90+180
+    return image_util.warp_split(frame, angle, (df.Nosex[i], df.Nosey[i]), start_index+faceshift, end_index-start_index, 700, flip)
+
+
+class Track:
+    def __init__(self, frames, height, width, seed=0):
+        rng = np.random.default_rng(seed)
+        self.head_angle = rng.uniform(-math.pi, math.pi, frames)
+        self.Nosex = rng.uniform(width * 0.25, width * 0.75, frames)
+        self.Nosey = rng.uniform(height * 0.25, height * 0.75, frames)
+
+
+def run(function, frames, track):
+    outputs = []
+    start = timer()
+    for i, frame in enumerate(frames):
+        outputs.append(function(frame, track.head_angle, track, i, 315, 630, 60, True))
+        outputs.append(function(frame, track.head_angle, track, i, 0, 315, 80, False))
+    return timer() - start, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='split rotate/crop benchmark')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--width', type=int, default=800)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    frames = [cv2.GaussianBlur(rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8), (0, 0), 2) for _ in range(args.frames)]
+    track = Track(args.frames, args.height, args.width)
+
+    legacy_time, legacy = run(split_legacy, frames, track)
+    warp_time, warped = run(split_warp, frames, track)
+
+    compared = [(a, b) for a, b in zip(legacy, warped) if a.shape == b.shape]
+    mismatch = sum(int((a != b).any(axis=2).sum()) for a, b in compared) / max(1, sum(a.shape[0] * a.shape[1] for a, _ in compared))
+    max_diff = max(int(np.abs(a.astype(int) - b).max()) for a, b in compared) if compared else 0
+
+    print(f'frames: {args.frames} ({args.width}x{args.height}), left + right per frame')
+    print(f'legacy (PIL rotate/pad/crop): {args.frames / legacy_time:8.1f} fps')
+    print(f'single warpAffine:            {args.frames / warp_time:8.1f} fps  (speedup x{legacy_time / warp_time:.1f})')
+    print(f'outputs compared: {len(compared)}/{len(legacy)} (legacy crop truncated at canvas edge otherwise)')
+    print(f'pixels sampled from different source pixel: {mismatch:.4%} (max abs diff {max_diff})')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+'''
+Profile top view stages (pose estimation -> left/right split -> FrameData) without trained model: synthetic pose backend
+writes DLC-format filtered csv files for generated trial videos; per-stage wall time (optionally cProfile top entries)
+--chain: whole top view chain (incl. left/right whisker pose) stage by stage vs per-trial dataflow; --pose-ms-per-frame
+simulates inference time of the pose backend
+
+- python dev/profile_synthetic_top_view.py --trials 4 --frames 400 --output /tmp/synthetic_session [--profile]
+- python dev/profile_synthetic_top_view.py --trials 8 --frames 400 --chain --pose-ms-per-frame 2
+--trial-workers process: split/FrameData trials in process pool ('split' stage budget); outputs compared to serial
+
+- python dev/profile_synthetic_top_view.py --trials 4 --frames 400 --frame-store
+- python dev/profile_synthetic_top_view.py --trials 8 --frames 400 --trial-workers process
+Stages run on a real Pipeline (constructed as run_post_acquisition.py does), so attributes missing from Pipeline.__init__
+or its mixins fail here too
+'''
+
+import argparse
+import cProfile
+import pstats
+import sys
+from pathlib import Path
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.behavior_pipeline import Pipeline
+from src.lib.frame_source import FrameStoreWriter
+from src.lib.pose_backend import get_pose_backend
+from src.lib.session_state import SessionStateStore
+from src.lib.stage_graph import StageGraph
+
+
+class Logger:
+    def logevent(self, message):
+        print(message)
+
+
+def top_view_pipeline(output: Path, trial_workers: str = 'serial') -> Pipeline:
+    '''
+    Pipeline for top view session in output (log file profile.log there), synthetic pose backend, log to stdout
+    '''
+    pipeline = Pipeline(output, output, 'top', 'copy', 'localhost', 'localhost', 'top_view', str(Path(output, 'profile.log')), 'profile', 1.05)
+    pipeline.fileLogger = Logger()
+    pipeline.pose_backend = 'synthetic'
+    pipeline.dataflow_pose_batch = 1
+    pipeline.trial_workers = trial_workers
+    return pipeline
+
+
+def make_trial_videos(output: Path, trials: int, frames: int, width: int = 800, height: int = 600, frame_store: bool = False):
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    for trial in range(trials):
+        video = cv2.VideoWriter(str(Path(output, f'{trial}.avi')), 0, 40, (width, height))
+        store = FrameStoreWriter(Path(output, f'{trial}.frames'), (width, height)) if frame_store else None
+        for frame_number in range(frames):
+            frame = np.roll(background, frame_number * 3 + trial, axis=1)
+            video.write(frame)
+            if store:
+                store.write(frame)
+        video.release()
+        if store:
+            store.close()
+
+
+def run_chain(stages: Pipeline, output: Path, dataflow: bool) -> float:
+    '''
+    Full top view chain on fresh outputs (pose outputs, split videos, FrameData removed; fingerprints in new store)
+    '''
+    for file in output.iterdir():
+        if not (file.suffix in ('.avi', '.frames') and file.stem.isdigit()):
+            file.unlink()
+    stages.open_session_index(output)
+    stages.kinematics_cache.clear()
+    stage_graph = StageGraph(output, SessionStateStore(Path(output, 'session_state.db')), stages.fileLogger)
+    trials = stages.get_session_index(output).trials('top_video')
+    top_view_stages = stages.top_view_stages(output, 'synthetic')
+    start = timer()
+    if dataflow:
+        stage_graph.run_dataflow(top_view_stages, trials)
+    else:
+        for stage in top_view_stages:
+            stage_graph.run_stage(stage, trials)
+    return timer() - start
+
+
+def compare_trial_workers(stages: Pipeline, output: Path, videos: list[Path]):
+    '''
+    Split + FrameData serial vs process pool on same pose outputs; split videos and FrameData table must be identical and
+    each DLC csv parsed once per trial (split), never again by FrameData
+    '''
+    import pandas as pd
+    stages.analyze_all_videos(videos, 'synthetic', shuffle=1)
+    split_videos = lambda: sorted(file for file in output.glob('M*.avi'))
+    results = {}
+    for trial_workers in ['serial', 'process']:
+        stages.trial_workers = trial_workers
+        for file in split_videos() + list(output.glob('FrameData*')):
+            file.unlink()
+        stages.open_session_index(output)
+        stages.kinematics_cache.clear()
+        start = timer()
+        split_results = stages.split_left_and_right_from_top_video(output)
+        split = timer() - start
+        start = timer()
+        frame_data_results = stages.writeFrameData_from_top_video(output)
+        frame_data = timer() - start
+        parsed = [sum(result['parsed'] for result in results) for results in (split_results, frame_data_results)]
+        print(f'{trial_workers:10s} split {split:8.2f} s, FrameData {frame_data:8.2f} s ({len(videos)} trials, {stages.executor_service.stage_budget["split"]} worker(s)); '
+              f'DLC csv parsed: split {parsed[0]}, FrameData {parsed[1]} ({"once per trial" if parsed == [len(videos), 0] else "NOT ONCE PER TRIAL"})')
+        results[trial_workers] = ({file.name: file.read_bytes() for file in split_videos()},
+                                  [pd.read_parquet(file) if file.suffix == '.parquet' else None for file in output.glob('FrameData.*')])
+    (serial_videos, serial_tables), (process_videos, process_tables) = results['serial'], results['process']
+    same_tables = len(serial_tables) == len(process_tables) and all(
+        a is None and b is None or a.equals(b) for a, b in zip(serial_tables, process_tables))
+    print(f'split videos {"identical" if serial_videos == process_videos else "DIFFERENT"}, '
+          f'FrameData {"identical" if same_tables else "DIFFERENT"}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='synthetic top view profile')
+    parser.add_argument('--trials', type=int, default=4)
+    parser.add_argument('--frames', type=int, default=400)
+    parser.add_argument('--output', type=Path, default=Path('/tmp/synthetic_session'))
+    parser.add_argument('--profile', action='store_true', help='print cProfile top 15 (cumulative) per stage')
+    parser.add_argument('--chain', action='store_true', help='time whole chain: stage by stage vs per-trial dataflow')
+    parser.add_argument('--pose-ms-per-frame', type=float, default=0.0, help='simulated pose inference time')
+    parser.add_argument('--frame-store', action='store_true', help='also write raw frame stores (split reads good frames from them)')
+    parser.add_argument('--trial-workers', choices=['serial', 'process'], default='serial')
+    parser.add_argument('--split-workers', type=int, default=None, help="'split' pool size (default: stage budget)")
+    args = parser.parse_args()
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    make_trial_videos(args.output, args.trials, args.frames, frame_store=args.frame_store)
+    videos = sorted(args.output.glob('[0-9]*.avi'))
+
+    stages = top_view_pipeline(args.output)
+    if args.split_workers:
+        stages.executor_service.stage_budget['split'] = args.split_workers #'split' POOL STARTS ON FIRST USE
+    try:
+        profile_stages(stages, args, videos)
+    finally:
+        stages.executor_service.shutdown()
+
+
+def profile_stages(stages: Pipeline, args, videos: list[Path]):
+    get_pose_backend('synthetic').frame_delay = args.pose_ms_per_frame / 1000
+    if args.trial_workers == 'process':
+        compare_trial_workers(stages, args.output, videos)
+        return
+    if args.chain:
+        for name, dataflow in [('stage by stage', False), ('dataflow', True)]:
+            print(f'{name:20s} {run_chain(stages, args.output, dataflow):8.2f} s ({args.trials} trials x {args.frames} frames)')
+        return
+
+    for name, function in [
+        ('pose estimation', lambda: stages.analyze_all_videos(videos, 'synthetic', shuffle=1)),
+        ('split left/right', lambda: stages.split_left_and_right_from_top_video(args.output)),
+        ('FrameData', lambda: stages.writeFrameData_from_top_video(args.output)),
+    ]:
+        profiler = cProfile.Profile() if args.profile else None
+        start = timer()
+        if profiler:
+            profiler.enable()
+        function()
+        if profiler:
+            profiler.disable()
+        print(f'{name:20s} {timer() - start:8.2f} s ({args.trials} trials x {args.frames} frames)')
+        if profiler:
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+
+
+if __name__ == "__main__":
+    main()
@@ -78,6 +78,8 @@ for subfolder in SETTINGS_PATH.glob('**/'):
     if not init_file.exists():
         init_file.touch()
 
+from src.lib.import_timer import ImportTimer
+import_timer = ImportTimer().install() #-X importtime STYLE REPORT OF START-UP (AND LATER STAGE) IMPORTS; WRITTEN TO LOG
 from src.behavior_pipeline import Pipeline
 
 
@@ -162,6 +164,9 @@ def main():
         log_file=log_file,
     )
 
+    pipeline.fileLogger.logevent(f"START-UP {import_timer.report()}")
+    startup_import_count = len(import_timer.records)
+
     #FOR MANUAL PROCESSING OF SPECIFIC FUNCTIONALITY
     function_mapping = {
         "all": pipeline.all,
@@ -183,6 +188,7 @@ def main():
     else:
         time_out_msg = f'took {total_elapsed_time} seconds.'
 
+    pipeline.fileLogger.logevent(f"STAGE (LAZY) {import_timer.report(since=startup_import_count)}")
     print(f"END {time_out_msg}")
     sep = "*" * 40 + "\n"
     pipeline.fileLogger.logevent(f"END {time_out_msg}\n{sep}")
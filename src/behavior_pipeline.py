@@ -3,6 +3,8 @@ from pathlib import Path
 from src.lib.movie_manager import MovieManager
 from src.lib.view_parsing_manager import ViewParsingManager
 from src.lib.file_logger import FileLogger
+from src.lib.scheduler import TrialScheduler, get_stage_budget
+from src.lib.executor_service import ExecutorService
 
 
 class Pipeline(MovieManager, ViewParsingManager):
@@ -28,6 +30,25 @@ class Pipeline(MovieManager, ViewParsingManager):
         self.fileLogger = FileLogger(log_file, self.debug)
         self.report_status()
         self.use_scratch = True # set to True to use scratch space (defined in - utilities::get_scratch_dir)
+        self.discovery_workers = 16 # concurrent stat/listing calls when scanning base_input_location (NFS latency bound; 1: serial)
+        self.top_video_format = 'avi_utvideo' # {trial}.avi written by movie creation: avi_utvideo | avi_ffv1 (lossless, same decoded frames; ffv1 smaller, slower) | avi (uncompressed rawvideo, previous)
+        self.raw_avi_export = False # also write uncompressed {trial}_raw.avi when top_video_format is lossless
+        self.write_frame_store = False # also write raw frame store {trial}.frames on scratch (random access for split); disk cost = uncompressed video (frames x H x W x 3 bytes per trial, all sessions of run at once); removed when session ends
+        self.frame_buffer_size = 64 # max decoded frames in flight per movie during movie creation (streaming; at least 2 decode batches) and queued per output encoder; warning logged if below 2 x decode workers
+        self.jpeg_decoder = 'auto' # opencv | pillow | turbojpeg | auto (micro-benchmark picks fastest at start of movie creation)
+        self.decode_batch_size = 8 # images decoded per worker task
+        self.pose_backend = 'deeplabcut' # deeplabcut | synthetic (deterministic DLC-format keypoints, no model; CPU-only profiling)
+        self.dlc_inference_mode = 'session' # session: DLC model loaded once per session for all trial videos | trial: reloaded per video
+        self.dlc_batch_size = 64 # frames per DLC inference batch (None: batch_size from model pose_cfg.yaml)
+        self.frame_data_format = 'parquet' # parquet | npz | xlsx: consolidated per-session FrameData table keyed by trial (parquet falls back to npz without pyarrow)
+        self.frame_data_xlsx_export = False # also write legacy per-trial {trial}FrameData.xlsx
+        self.top_view_dataflow = False # per-trial dataflow across top view stages (split overlaps pose estimation); False: stage by stage (pose model loaded once per view)
+        self.dataflow_pose_batch = 4 # trials per pose estimation call in dataflow mode; DeepLabCut reloads the model per call (~trials/batch loads per view): benchmark with real backend before enabling dataflow
+        self.stage_fingerprint_digest = False # also hash stage inputs/outputs (content digest) for resume; default size + mtime only
+        self.trial_workers = 'process' # process: top view split/FrameData trials sharded over 'split' process pool | serial: one trial at a time in this process
+        self.split_worker_memory_mb = 2048 # memory budget per split worker; caps 'split' pool size by available memory
+        self.executor_service = ExecutorService(get_stage_budget(split_worker_memory_mb=self.split_worker_memory_mb), self.debug).start('decode') # long-lived worker pools ('split' started by top view processing); shut down at end of all()/movie_creation()
+        self.scheduler = TrialScheduler(self.executor_service, self.debug) # global (folder, session, trial) work scheduler; CPU budget per stage
 
 
     def report_status(self):
@@ -45,54 +66,59 @@ class Pipeline(MovieManager, ViewParsingManager):
         
 
     def all(self):
-        
-        if self.base_input_location.is_dir():
-            self.fileLogger.logevent(f"INPUT FOLDER: {self.base_input_location}".ljust(20))
-        else:
-            self.fileLogger.logevent(f"INPUT FOLDER DOES NOT EXIST; EXITING: {self.base_input_location}".ljust(20))
-            exit()
-
-        self.base_output_location.mkdir(parents=True, exist_ok=True)
-        self.fileLogger.logevent(f"FINAL OUTPUT FOLDER: {self.base_output_location}".ljust(20))
-    
-        #CHECK COUNT OF OUTSTANDING JOBS IN base_input_location
-        metadata_status = self.fileLogger.read_metadata_status_files(self.base_input_location, self.debug)
-        total_count = sum(len(subfolder_dict) for subfolder_dict in metadata_status.values())
-        self.fileLogger.logevent(f"There are {total_count} outstanding job(s) to process.".ljust(20))
-        
-        self.process_img_recordings(metadata_status)
-        
-        if self.perspective == 'top':
-            self.process_top_view_videos(metadata_status)
-        elif self.perspective == 'side':
-            self.process_side_view_videos(metadata_status)
-        else:
-            print(f'Invalid perspective: {self.perspective}')
+        try:
+            if self.base_input_location.is_dir():
+                self.fileLogger.logevent(f"INPUT FOLDER: {self.base_input_location}".ljust(20))
+            else:
+                self.fileLogger.logevent(f"INPUT FOLDER DOES NOT EXIST; EXITING: {self.base_input_location}".ljust(20))
+                exit()
+
+            self.base_output_location.mkdir(parents=True, exist_ok=True)
+            self.fileLogger.logevent(f"FINAL OUTPUT FOLDER: {self.base_output_location}".ljust(20))
+
+            #CHECK COUNT OF OUTSTANDING JOBS IN base_input_location
+            metadata_status = self.fileLogger.read_metadata_status_files(self.base_input_location, self.debug, self.discovery_workers)
+            total_count = sum(len(subfolder_dict) for subfolder_dict in metadata_status.values())
+            self.fileLogger.logevent(f"There are {total_count} outstanding job(s) to process.".ljust(20))
+
+            self.process_img_recordings(metadata_status)
 
-        #CLEAN UP staging_output
-        # if SCRATCH.exists():
-        #     print(f'Removing {SCRATCH}')
-        #     delete_in_background(SCRATCH)
+            if self.perspective == 'top':
+                self.process_top_view_videos(metadata_status)
+            elif self.perspective == 'side':
+                self.process_side_view_videos(metadata_status)
+            else:
+                print(f'Invalid perspective: {self.perspective}')
+
+            #CLEAN UP staging_output
+            # if SCRATCH.exists():
+            #     print(f'Removing {SCRATCH}')
+            #     delete_in_background(SCRATCH)
+        finally:
+            self.executor_service.shutdown() #CLEAN SHUTDOWN OF PIPELINE-WIDE WORKER POOLS
 
 
     def movie_creation(self):
-        if self.debug:
-            print(f'DEBUG: Start movie_creation')
-        if self.base_input_location.is_dir():
-            self.fileLogger.logevent(f"INPUT FOLDER: {self.base_input_location}".ljust(20))
-        else:
-            self.fileLogger.logevent(f"INPUT FOLDER DOES NOT EXIST; EXITING: {self.base_input_location}".ljust(20))
-            exit()
-            
-        self.base_output_location.mkdir(parents=True, exist_ok=True)
-        self.fileLogger.logevent(f"FINAL OUTPUT FOLDER: {self.base_output_location}".ljust(20))
-                                 
-        #CHECK COUNT OF OUTSTANDING JOBS IN base_input_location
-        metadata_status = self.fileLogger.read_metadata_status_files(self.base_input_location, self.debug)
-        total_count = sum(len(subfolder_dict) for subfolder_dict in metadata_status.values())
-        self.fileLogger.logevent(f"There are {total_count} outstanding job(s) to process.".ljust(20))
-        
-        self.process_img_recordings(metadata_status)
+        try:
+            if self.debug:
+                print(f'DEBUG: Start movie_creation')
+            if self.base_input_location.is_dir():
+                self.fileLogger.logevent(f"INPUT FOLDER: {self.base_input_location}".ljust(20))
+            else:
+                self.fileLogger.logevent(f"INPUT FOLDER DOES NOT EXIST; EXITING: {self.base_input_location}".ljust(20))
+                exit()
+
+            self.base_output_location.mkdir(parents=True, exist_ok=True)
+            self.fileLogger.logevent(f"FINAL OUTPUT FOLDER: {self.base_output_location}".ljust(20))
+
+            #CHECK COUNT OF OUTSTANDING JOBS IN base_input_location
+            metadata_status = self.fileLogger.read_metadata_status_files(self.base_input_location, self.debug, self.discovery_workers)
+            total_count = sum(len(subfolder_dict) for subfolder_dict in metadata_status.values())
+            self.fileLogger.logevent(f"There are {total_count} outstanding job(s) to process.".ljust(20))
+
+            self.process_img_recordings(metadata_status)
 
-        if self.debug:
-            print(f'DEBUG: End movie_creation')
\ No newline at end of file
+            if self.debug:
+                print(f'DEBUG: End movie_creation')
+        finally:
+            self.executor_service.shutdown() #CLEAN SHUTDOWN OF PIPELINE-WIDE WORKER POOLS
\ No newline at end of file
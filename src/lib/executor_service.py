@@ -0,0 +1,59 @@
+"""
+-Pipeline-wide executor service: long-lived worker pools created once (Pipeline.__init__) and shared by all stages
+-Tasks submitted to process pools should be module-level functions (see src/lib/tasks.py) so only their
+ arguments are pickled, never the pipeline object
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import ProcessPoolExecutor
+
+from src.lib.utilities import get_nworkers
+
+
+class ExecutorService:
+    '''
+    Named process/thread pools sized by stage budget {pool name: max workers}
+    Pools are created on first use (or up front with start()) and live until shutdown()
+    '''
+
+    def __init__(self, stage_budget: dict, debug: bool = False):
+        self.stage_budget = stage_budget
+        self.debug = debug
+        self.thread_pools = {}
+        self.process_pools = {}
+
+    def start(self, *process_pool_names: str):
+        '''
+        Starts process pools now; with fork start method workers copy the parent's open file descriptors,
+        so pools should be started before any pipes (ffmpeg stdin) are opened
+        '''
+        for name in process_pool_names:
+            self.process_pool(name)
+        return self
+
+    def thread_pool(self, name: str) -> ThreadPoolExecutor:
+        if name not in self.thread_pools:
+            self.thread_pools[name] = ThreadPoolExecutor(max_workers=self.stage_budget.get(name, 1), thread_name_prefix=name)
+        return self.thread_pools[name]
+
+    def process_pool(self, name: str) -> ProcessPoolExecutor:
+        if name not in self.process_pools:
+            workers = self.stage_budget.get(name, get_nworkers())
+            executor = ProcessPoolExecutor(max_workers=workers)
+            executor.submit(int).result() #FORCES ALL WORKERS TO START
+            self.process_pools[name] = executor
+            if self.debug:
+                print(f'DEBUG: ExecutorService started process pool {name} ({workers} workers)')
+        return self.process_pools[name]
+
+    def shutdown(self, wait: bool = True):
+        for executor in list(self.thread_pools.values()) + list(self.process_pools.values()):
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+        self.thread_pools = {}
+        self.process_pools = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -5,10 +5,13 @@
 
 import os
 import logging
+import threading
 from datetime import datetime
 from pathlib import Path
 import json
 
+from src.lib.session_state import write_json_atomic
+
 class FileLogger:
     """This class defines the file logging mechanism
     the first instance of FileLogger class defines default log file name and complete path 'LOGFILE_PATH'
@@ -51,6 +54,8 @@ class FileLogger:
         # Add the handler to the logger
         self.logger.addHandler(file_handler)
         self.debug = debug
+        self._session_state = None
+        self._session_state_lock = threading.Lock()
 
     def log_info(self, message):
         self.logger.info(message)
@@ -77,106 +82,16 @@ class FileLogger:
         return timestamp
     
 
-    def read_metadata_status_files(self, base_input_location, debug):
-        base_data_dir = [d for d in Path(base_input_location).iterdir() if d.is_dir()]  # List of Path objects for directories
-        
-        status_json_exists = {}
-        subfolder_counts = {}
-        
-        for dir_name in base_data_dir:
-            status_json_path = dir_name / "status.json"
-        
-            # Check if status.json exists
-            if status_json_path.exists():
-                status_json_exists[dir_name.name] = True
-
-                if debug:
-                    print(f'status.json exists for {dir_name}')
-
-                # Load the existing status.json content
-                with open(status_json_path, 'r') as status_file:
-                    stored_subfolders = json.load(status_file)
-                
-                # Get the current subfolders in the directory
-                current_subfolders = {
-                    subfolder.name: subfolder
-                    for subfolder in dir_name.iterdir() if subfolder.is_dir()
-                }
-
-                # Compare stored subfolders with current subfolders
-                stored_subfolder_names = set(stored_subfolders.keys())
-
-                # If subfolders have changed, update status.json
-                if stored_subfolder_names != current_subfolders.keys():
-                    print(f"Subfolders have changed in {dir_name.name}. Updating status.json.")
-                    subfolders_dict = {
-                        subfolder.name: {
-                            "processed": (subfolder / "meta-data.json").exists(),  # Check if 'meta-data.json' exists
-                            "folder_cnt": sum(1 for sub in subfolder.iterdir() if sub.is_dir())  # Count subdirectories
-                        }
-                        for subfolder in current_subfolders.values()
-                    }
-                    # Write the updated subfolder information to status.json
-                    with open(status_json_path, 'w') as status_file:
-                        json.dump(subfolders_dict, status_file, indent=4)
-                    status_json_exists[dir_name.name] = False  # Mark it as updated
-                else:
-                    print("No subfolders count change.  Checking progress...")
-                    
-                    # Check for subfolders marked as 'processed': false and recheck for 'meta-data.json'
-                    for subfolder_name, subfolder_info in stored_subfolders.items():
-                        # Ensure the 'processed' key exists, defaulting to False if not
-                        if subfolder_info.get("processed", False) is False:  # If processed is False, check for 'meta-data.json'
-                            meta_data_filename = Path(dir_name, subfolder_name, "meta-data.json")
-                            subfolder = Path(dir_name, subfolder_name)
-
-                            if (meta_data_filename).exists():
-                                print(f'Reading {meta_data_filename}')
-                                task = self.read_individual_json_manifest(meta_data_filename, debug)
-
-                                # Update the subfolder's folder count (number of subdirectories)
-                                subfolder_info["folder_cnt"] = sum(1 for sub in subfolder.iterdir() if sub.is_dir())
-                            else:
-                                if debug:
-                                    print(f'{meta_data_filename} does not exist. Creating')
-                                task = self.create_individual_json_manifest(meta_data_filename, subfolder, debug)
-
-                    # Save updated status.json after checking
-                    with open(status_json_path, 'w') as status_file:
-                        json.dump(stored_subfolders, status_file, indent=4)
-
-                    # If there is at least one non-processed subfolder with more than 0 subfolders, create the result dictionary
-                    for subfolder_name, subfolder_info in stored_subfolders.items():
-                        if not subfolder_info["processed"] and subfolder_info["folder_cnt"] > 0:
-                            if dir_name.name not in subfolder_counts:
-                                subfolder_counts[dir_name.name] = {}
-                            subfolder_counts[dir_name.name][subfolder_name] = [subfolder_info["folder_cnt"], task]
-            
-            else:
-                print(f'Creating status.json in {dir_name.name}')
-                status_json_exists[dir_name.name] = False
-                
-                # If status.json does not exist, create it
-                subfolders_dict = {
-                    subfolder.name: {
-                        "processed": (subfolder / "meta-data.json").exists(),  # Check if 'meta-data.json' exists
-                        "folder_cnt": sum(1 for sub in subfolder.iterdir() if sub.is_dir())  # Count subdirectories
-                    }
-                    for subfolder in dir_name.iterdir() if subfolder.is_dir()
-                }
-                
-                # Write the subfolder information to status.json
-                with open(status_json_path, 'w') as status_file:
-                    json.dump(subfolders_dict, status_file, indent=4)
-                
-                # Check the newly created status.json for non-processed subfolders with > 0 subfolders
-                for subfolder_name, subfolder_info in subfolders_dict.items():
-                    if not subfolder_info["processed"] and subfolder_info["folder_cnt"] > 0:
-                        if dir_name.name not in subfolder_counts:
-                            subfolder_counts[dir_name.name] = {}
-                        subfolder_counts[dir_name.name][subfolder_name] = [subfolder_info["folder_cnt"], task]
-
-        return subfolder_counts
+    def read_metadata_status_files(self, base_input_location, debug, workers: int = 16):
+        '''
+        Returns {animal folder: {session: [folder_cnt, last_task]}} of sessions not yet processed that contain trial folders
+        Creates/updates status.json (per animal folder) and meta-data.json (per unprocessed session)
+        Incremental: folders unchanged since last run (mtime) are answered from local discovery cache, processed
+        sessions are not rescanned (see session_discovery)
+        workers: max concurrent filesystem calls (1: serial)
+        '''
+        from src.lib.session_discovery import SessionDiscovery
+        return SessionDiscovery(self, base_input_location, debug, workers=workers).run()
     
 
     def read_individual_json_manifest(self, meta_data_file_location, debug: bool):
@@ -193,8 +108,7 @@ class FileLogger:
                 folder_manifest['last_task'] = 'create_json_manifest'
 
                 # Optionally, save the updated JSON back to the file
-                with open(meta_data_file_location, 'w') as status_file:
-                    json.dump(folder_manifest, status_file, indent=4)
+                write_json_atomic(meta_data_file_location, folder_manifest)
 
                 print(f"Updated 'last_task' to: {folder_manifest['last_task']}")
 
@@ -203,15 +117,20 @@ class FileLogger:
             print(f"Error loading JSON file: {e}")
 
 
-    def create_individual_json_manifest(self, meta_data_file_location, subfolder: Path, debug: bool):
-        all_folders = [f.name for f in subfolder.iterdir() if f.is_dir()]
+    def create_individual_json_manifest(self, meta_data_file_location, subfolder: Path, debug: bool, all_folders: list = None):
+        '''
+        all_folders: trial folder names if already listed by caller (saves a listing round trip)
+        '''
+        if all_folders is None:
+            with os.scandir(subfolder) as entries:
+                all_folders = [entry.name for entry in entries if entry.is_dir()]
+        all_folders = list(all_folders)
         all_folders.sort(key=lambda x: int(x) if x.isdigit() else x)
         meta = {}
         meta['folders'] = all_folders
         meta['last_task'] = 'create_json_manifest'
         try:
-            with open(meta_data_file_location, 'w') as json_file:
-                json.dump(meta, json_file, indent=4)
+            write_json_atomic(meta_data_file_location, meta)
             
             if debug:
                 print(f"Created JSON manifest at {meta_data_file_location}")
@@ -221,25 +140,33 @@ class FileLogger:
         return meta['last_task']
     
 
+    @property
+    def session_state(self):
+        '''
+        Session state store (stage transitions journal, exports meta-data.json / status.json); opened on first use,
+        exports transitions left pending by an interrupted run
+        '''
+        with self._session_state_lock: #FIRST USE MAY COME FROM SEVERAL WORKER THREADS
+            if self._session_state is None:
+                from src.lib.session_state import SessionStateStore
+                self._session_state = SessionStateStore(debug=self.debug)
+                self._session_state.flush()
+        return self._session_state
+
+
     def update_individual_json_manifest(self, meta_data_file_location, task: str):
-        
+        '''
+        Records 'last_task' transition in session state store; meta-data.json rewritten atomically (at end of batch if in
+        session_state.batch())
+        '''
         try:
-            # Read the existing JSON file if it exists
             if Path(meta_data_file_location).exists():
-                with open(meta_data_file_location, 'r') as json_file:
-                    meta = json.load(json_file)
-
-                # Update 'last_task' with the new task
-                meta['last_task'] = task
-
-                # Save the updated JSON back to the file
-                with open(meta_data_file_location, 'w') as json_file:
-                    json.dump(meta, json_file, indent=4)
+                self.session_state.record(meta_data_file_location, None, 'last_task', task)
 
                 if self.debug:
                     print(f"Updated 'last_task' to '{task}' in {meta_data_file_location}")
 
-                return meta['last_task']
+                return task
 
         except Exception as e:
             print(f"Error updating JSON manifest: {e}")
@@ -249,6 +176,7 @@ class FileLogger:
     def update_metadata_status_file(self, status_file_location: Path, entry: tuple):
         '''
         'entry' tuple has following structure: (session, 'processed', True)
+        Validated against current status.json, recorded in session state store; status.json rewritten atomically
         '''
         status_file_location = Path(status_file_location, 'status.json')
         
@@ -274,12 +202,7 @@ class FileLogger:
         if key not in status_data[session]:
             raise KeyError(f"Key '{key}' does not exist in session '{session}'.")
 
-        # Update the specified key with the new value
-        status_data[session][key] = value
-
-        # Write the updated data back to status.json
-        with open(status_file_location, 'w') as status_file:
-            json.dump(status_data, status_file, indent=4)
+        self.session_state.record(status_file_location, session, key, value)
 
         if self.debug:
-            print(f"Updated status.json data: {status_data}")
\ No newline at end of file
+            print(f"Recorded status.json update: {entry}")
@@ -0,0 +1,128 @@
+"""
+-FrameData (per good frame of top view: goodframes, Angle, Nosex, Nosey, Snoutx, Snouty) table and pluggable writers
+-Default: one consolidated columnar table per session keyed by trial (FrameData.parquet, or FrameData.npz without pyarrow)
+ instead of one workbook per trial
+-XLSX ({trial}FrameData.xlsx, previous per-trial layout) is an optional export; openpyxl write-only mode streams rows
+ (no per-cell objects)
+"""
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+FRAME_DATA_COLUMNS = ['goodframes', 'Angle', 'Nosex', 'Nosey', 'Snoutx', 'Snouty']
+
+
+def frame_data_table(good_frames, df: pd.DataFrame, angle) -> pd.DataFrame:
+    '''
+    FrameData rows for selected (good) frames only; good_frames: kinematics.GoodFrames
+    '''
+    pos = good_frames.frame_index
+    return pd.DataFrame({
+        "goodframes": pos,
+        "Angle": np.asarray(angle)[pos],
+        "Nosex": df.Nosex.to_numpy()[pos],
+        "Nosey": df.Nosey.to_numpy()[pos],
+        "Snoutx": df.Snoutx1.to_numpy()[pos],
+        "Snouty": df.Snouty1.to_numpy()[pos],
+    })
+
+
+class ParquetWriter:
+    name = 'parquet'
+    extension = '.parquet'
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import pyarrow
+        except ImportError:
+            return False
+        return True
+
+    def write(self, table: pd.DataFrame, output_filename: Path):
+        table.to_parquet(output_filename, engine='pyarrow', index=False)
+
+    def read(self, input_filename: Path) -> pd.DataFrame:
+        return pd.read_parquet(input_filename, engine='pyarrow')
+
+
+class NPZWriter:
+    '''
+    One array per column (np.load(...)['trial'], ['goodframes'], ...); numpy only
+    '''
+    name = 'npz'
+    extension = '.npz'
+
+    @staticmethod
+    def available() -> bool:
+        return True
+
+    def write(self, table: pd.DataFrame, output_filename: Path):
+        np.savez(output_filename, **{column: table[column].to_numpy() for column in table.columns})
+
+    def read(self, input_filename: Path) -> pd.DataFrame:
+        with np.load(input_filename) as arrays:
+            return pd.DataFrame({column: arrays[column] for column in arrays.files})
+
+
+class XLSXWriter:
+    name = 'xlsx'
+    extension = '.xlsx'
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import openpyxl
+        except ImportError:
+            return False
+        return True
+
+    def write(self, table: pd.DataFrame, output_filename: Path):
+        from openpyxl import Workbook
+        wb_target = Workbook(write_only=True)
+        writer = wb_target.create_sheet()
+        writer.append(list(table.columns))
+        for row in table.itertuples(index=False, name=None):
+            writer.append(row)
+        wb_target.save(output_filename)
+
+    def read(self, input_filename: Path) -> pd.DataFrame:
+        return pd.read_excel(input_filename, engine='openpyxl')
+
+
+FRAME_DATA_WRITERS = {
+    ParquetWriter.name: ParquetWriter,
+    NPZWriter.name: NPZWriter,
+    XLSXWriter.name: XLSXWriter,
+}
+
+
+def get_frame_data_writer(writer: str = 'parquet'):
+    '''
+    Writer instance by name; 'parquet' falls back to 'npz' if pyarrow is not installed
+    '''
+    if writer not in FRAME_DATA_WRITERS:
+        raise ValueError(f"Unsupported FrameData format: {writer}; choose from {list(FRAME_DATA_WRITERS)}")
+    if not FRAME_DATA_WRITERS[writer].available():
+        if writer != ParquetWriter.name:
+            raise ImportError(f"FrameData format {writer} is not available (missing package)")
+        writer = NPZWriter.name
+    return FRAME_DATA_WRITERS[writer]()
+
+
+def write_session_frame_data(tables: dict, output_dir: Path, writer: str = 'parquet') -> Path:
+    '''
+    Consolidates per-trial FrameData tables {trial: DataFrame} into output_dir/FrameData{extension}, keyed by 'trial' column
+    '''
+    frame_data_writer = get_frame_data_writer(writer)
+    frames = [table.assign(trial=trial) for trial, table in sorted(tables.items())]
+    if frames:
+        session_table = pd.concat(frames, ignore_index=True)
+    else:
+        session_table = pd.DataFrame(columns=FRAME_DATA_COLUMNS + ['trial'])
+    session_table = session_table[['trial'] + FRAME_DATA_COLUMNS]
+    output_filename = Path(output_dir, f'FrameData{frame_data_writer.extension}')
+    frame_data_writer.write(session_table, output_filename)
+    return output_filename
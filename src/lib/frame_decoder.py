@@ -0,0 +1,142 @@
+"""
+-Pluggable JPEG decoder layer (OpenCV, Pillow draft mode, turbojpeg if installed)
+-All backends return BGR uint8 frames (same as cv2.imread) or None if file cannot be decoded
+-'reduce' (1, 2, 4, 8) decodes at reduced resolution in DCT domain (much cheaper than full decode + resize);
+ intended for preview outputs
+-benchmark_decoders / select_fastest_decoder time backends on sample images (run once at start of movie creation)
+"""
+
+import time
+import cv2
+import numpy as np
+
+
+REDUCE_FACTORS = (1, 2, 4, 8)
+
+
+class OpenCVDecoder:
+    name = 'opencv'
+    READ_FLAGS = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+
+    @staticmethod
+    def available() -> bool:
+        return True
+
+    def decode(self, image_path: str, reduce: int = 1):
+        return cv2.imread(str(image_path), self.READ_FLAGS[reduce])
+
+
+class PillowDecoder:
+    name = 'pillow'
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import PIL.Image
+        except ImportError:
+            return False
+        return True
+
+    def decode(self, image_path: str, reduce: int = 1):
+        from PIL import Image
+        try:
+            with Image.open(image_path) as img:
+                if reduce > 1:
+                    img.draft('RGB', (img.width // reduce, img.height // reduce)) #DCT-DOMAIN SCALING (JPEG ONLY)
+                rgb = np.asarray(img.convert('RGB'))
+        except (OSError, ValueError):
+            return None
+        return np.ascontiguousarray(rgb[:, :, ::-1])
+
+
+class TurboJPEGDecoder:
+    name = 'turbojpeg'
+
+    def __init__(self):
+        self.jpeg = None
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            from turbojpeg import TurboJPEG
+            TurboJPEG()
+        except Exception: #MODULE OR libturbojpeg SHARED LIBRARY MISSING
+            return False
+        return True
+
+    def decode(self, image_path: str, reduce: int = 1):
+        from turbojpeg import TurboJPEG, TJPF_BGR
+        if self.jpeg is None:
+            self.jpeg = TurboJPEG()
+        try:
+            with open(image_path, 'rb') as image_file:
+                return self.jpeg.decode(image_file.read(), pixel_format=TJPF_BGR, scaling_factor=(1, reduce) if reduce > 1 else None)
+        except (OSError, ValueError):
+            return None
+
+
+DECODERS = {
+    OpenCVDecoder.name: OpenCVDecoder,
+    PillowDecoder.name: PillowDecoder,
+    TurboJPEGDecoder.name: TurboJPEGDecoder,
+}
+
+_instances = {} #ONE DECODER INSTANCE PER BACKEND PER PROCESS
+
+
+def get_decoder(backend: str = 'opencv'):
+    if backend not in DECODERS:
+        raise ValueError(f"Unsupported JPEG decoder: {backend}; choose from {list(DECODERS)}")
+    if backend not in _instances:
+        _instances[backend] = DECODERS[backend]()
+    return _instances[backend]
+
+
+def available_decoders() -> list[str]:
+    return [name for name, decoder in DECODERS.items() if decoder.available()]
+
+
+def decode_batch(image_paths: list[str], backend: str = 'opencv', reduce: int = 1) -> list[tuple]:
+    '''
+    Decodes list of images; returns [(image_path, frame)] (frame is None if unreadable)
+    '''
+    if reduce not in REDUCE_FACTORS:
+        raise ValueError(f"Unsupported reduce factor: {reduce}; choose from {REDUCE_FACTORS}")
+    decoder = get_decoder(backend)
+    return [(image_path, decoder.decode(image_path, reduce)) for image_path in image_paths]
+
+
+def benchmark_decoders(sample_images: list[str], reduce: int = 1, repeats: int = 3) -> dict:
+    '''
+    Micro-benchmark: best-of-repeats decode time (seconds per image) for every available backend
+    '''
+    timings = {}
+    for backend in available_decoders():
+        decoder = get_decoder(backend)
+        if decoder.decode(sample_images[0], reduce) is None:
+            continue
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for image_path in sample_images:
+                decoder.decode(image_path, reduce)
+            best = min(best, time.perf_counter() - start)
+        timings[backend] = best / len(sample_images)
+    return timings
+
+
+def select_fastest_decoder(sample_images: list[str], reduce: int = 1) -> tuple[str, dict]:
+    '''
+    Returns (fastest backend name, timings); falls back to 'opencv' if no sample could be decoded
+    '''
+    if not sample_images:
+        return OpenCVDecoder.name, {}
+    timings = benchmark_decoders(sample_images, reduce)
+    if not timings:
+        return OpenCVDecoder.name, timings
+    return min(timings, key=timings.get), timings
@@ -0,0 +1,210 @@
+"""
+-Frame sources of a top view trial: stages read frames through one interface instead of opening {trial}.avi with
+ cv2.VideoCapture themselves
+    -'video': any container OpenCV decodes ({trial}.avi: uncompressed rawvideo or lossless ffv1/utvideo, see video_sinks)
+    -'jpeg': original trial folder of JPEG images (natural sort order, as used by movie creation)
+    -'memmap': raw frame store {trial}.frames on scratch (written by movie creation next to the movies): fixed-stride
+     header + N x H x W x 3 uint8, memory-mapped read-only -> any frame without decoding, zero-copy, from any number
+     of processes at once
+-All sources yield BGR uint8 frames identical to what cv2.VideoCapture returns for the uncompressed {trial}.avi
+ movie creation used to write (lossless containers are written channel-reversed for this, see video_sinks)
+-frames(indices) yields only requested frames (increasing order): sequential sources skip others without decoding
+ them to BGR (grab), random-access sources read requested frames only
+"""
+
+import os
+import re
+import struct
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+
+
+def list_trial_images(image_dir) -> list[str]:
+    '''
+    JPEG images of single trial folder, natural sort of file names
+    '''
+    return sorted(
+        [str(f) for f in Path(image_dir).iterdir() if f.suffix.lower() in IMAGE_EXTENSIONS],
+        key=lambda x: [int(c) if c.isdigit() else c.lower() for c in re.split(r'(\d+)', x)]
+    )
+
+
+class VideoFileSource:
+    name = 'video'
+
+    def __init__(self, path):
+        self.path = str(path)
+        cap = cv2.VideoCapture(self.path)
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+    def __len__(self):
+        return self.frame_count
+
+    def frames(self, indices=None):
+        '''
+        (index, frame) for requested indices (all frames if None); stops at end of video
+        '''
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            print(f"Error opening the video file {self.path}")
+        try:
+            frame_idx = 0
+            if indices is None:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret or frame is None:
+                        return
+                    yield frame_idx, frame
+                    frame_idx += 1
+            for index in indices:
+                while frame_idx < index and cap.grab():
+                    frame_idx += 1
+                if frame_idx < index:
+                    return
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    return
+                frame_idx += 1
+                yield index, frame
+        finally:
+            cap.release()
+
+
+class JPEGDirectorySource:
+    '''
+    Random access: only requested images are decoded (frame_decoder backend)
+    '''
+    name = 'jpeg'
+
+    def __init__(self, path, decoder: str = 'opencv'):
+        self.path = Path(path)
+        self.images = list_trial_images(self.path)
+        self.decoder = decoder
+
+    def __len__(self):
+        return len(self.images)
+
+    def frames(self, indices=None):
+        from src.lib.frame_decoder import get_decoder
+        decoder = get_decoder(self.decoder)
+        for index in (range(len(self.images)) if indices is None else indices):
+            if index >= len(self.images):
+                return
+            frame = decoder.decode(self.images[index])
+            if frame is None: #UNREADABLE IMAGE ENDS STREAM (MOVIE CREATION DROPS IT: LATER VIDEO FRAMES ARE SHIFTED BY ONE)
+                return
+            yield index, frame
+
+
+FRAME_STORE_MAGIC = b'FRAMES01'
+FRAME_STORE_HEADER = struct.Struct('<8sQIII') #MAGIC, FRAME COUNT, HEIGHT, WIDTH, CHANNELS
+FRAME_STORE_HEADER_SIZE = 64 #FRAMES START 64-BYTE ALIGNED
+FRAME_STORE_EXTENSION = '.frames'
+
+
+class FrameStoreWriter:
+    '''
+    Appends frames to {name}.frames.tmp; close() writes frame count to header and renames to {name}.frames (readers
+    never see a partial store). abort() (failed write, failed producer) deletes {name}.frames.tmp instead.
+    Same write/close interface as video_sinks.FFmpegSink
+    '''
+    def __init__(self, output_filename, size: tuple[int, int], channels: int = 3):
+        self.output_filename = str(output_filename)
+        self.tmp_filename = f'{self.output_filename}.tmp'
+        self.width, self.height = size
+        self.channels = channels
+        self.frame_count = 0
+        self.file = open(self.tmp_filename, 'wb')
+        self.file.write(bytes(FRAME_STORE_HEADER_SIZE)) #HEADER WRITTEN ON CLOSE
+
+    def write(self, frame: np.ndarray):
+        if frame.shape != (self.height, self.width, self.channels) or frame.dtype != np.uint8:
+            raise ValueError(f"Frame {frame.shape} {frame.dtype} does not match frame store {(self.height, self.width, self.channels)} uint8")
+        self.file.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+        self.frame_count += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(FRAME_STORE_HEADER.pack(FRAME_STORE_MAGIC, self.frame_count, self.height, self.width, self.channels))
+        self.file.close()
+        os.replace(self.tmp_filename, self.output_filename)
+
+    def abort(self):
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.tmp_filename):
+            os.unlink(self.tmp_filename)
+
+
+def remove_frame_stores(folder) -> list[Path]:
+    '''
+    Deletes raw frame stores ({trial}.frames and leftover .tmp) of session folder; returns removed store paths
+    '''
+    removed = []
+    for path in Path(folder).glob(f'*{FRAME_STORE_EXTENSION}*'):
+        path.unlink(missing_ok=True)
+        if path.suffix == FRAME_STORE_EXTENSION:
+            removed.append(path)
+    return removed
+
+
+class MemmapFrameSource:
+    '''
+    Read-only memory map of frame store; frames are views into the page cache (do not modify)
+    '''
+    name = 'memmap'
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, 'rb') as f:
+            magic, frame_count, height, width, channels = FRAME_STORE_HEADER.unpack(f.read(FRAME_STORE_HEADER.size))
+        if magic != FRAME_STORE_MAGIC:
+            raise ValueError(f"Not a frame store: {self.path}")
+        self.size = (width, height)
+        self.frame_count = frame_count
+        self.array = np.memmap(self.path, dtype=np.uint8, mode='r', offset=FRAME_STORE_HEADER_SIZE,
+                               shape=(frame_count, height, width, channels)) if frame_count else np.empty((0, height, width, channels), np.uint8)
+
+    def __len__(self):
+        return self.frame_count
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self.array[index]
+
+    def frames(self, indices=None):
+        for index in (range(self.frame_count) if indices is None else indices):
+            if index >= self.frame_count:
+                return
+            yield index, self.array[index]
+
+
+FRAME_SOURCES = {
+    VideoFileSource.name: VideoFileSource,
+    JPEGDirectorySource.name: JPEGDirectorySource,
+    MemmapFrameSource.name: MemmapFrameSource,
+}
+
+
+def open_frame_source(path, source: str = None, **kwargs):
+    '''
+    Frame source for path; type from path if not given (directory: 'jpeg', .frames: 'memmap', other files: 'video')
+    '''
+    if source is None:
+        if Path(path).is_dir():
+            source = JPEGDirectorySource.name
+        elif Path(path).suffix == FRAME_STORE_EXTENSION:
+            source = MemmapFrameSource.name
+        else:
+            source = VideoFileSource.name
+    if source not in FRAME_SOURCES:
+        raise ValueError(f"Unsupported frame source: {source}; choose from {list(FRAME_SOURCES)}")
+    return FRAME_SOURCES[source](path, **kwargs)
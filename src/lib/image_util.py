@@ -2,9 +2,11 @@ import os
 import cv2 
 import numpy as np
 import subprocess
-from pathlib import Path
 from PIL import Image
 import math 
+from functools import lru_cache
+from src.lib.frame_decoder import get_decoder, decode_batch
+from src.lib import kinematics
 
 
 def get_image_names(data_path):
@@ -18,15 +20,18 @@ def get_image_names(data_path):
     files = [os.path.join(data_path,files[i]) for i in sort_id]
     return files
 
-def make_movies(images, save_path):
+def make_movies(images, save_path, backend='opencv', reduce=1, batch_size=8):
+    '''
+    reduce (2, 4, 8): reduced-resolution (DCT-domain) decode, e.g. for preview movies
+    '''
     if len(images)==0:
         return
-    frame = cv2.imread(images[0])
+    frame = get_decoder(backend).decode(images[0], reduce)
     height, width, _ = frame.shape
     video = cv2.VideoWriter(save_path, 0, 40, (width, height))
-    for idx, _ in enumerate(images):
-        frame = cv2.imread(images[idx])
-        video.write(frame)
+    for idx in range(0, len(images), batch_size):
+        for _, frame in decode_batch(images[idx:idx + batch_size], backend, reduce):
+            video.write(frame)
     video.release()
     
 # def convert_video(video_input, video_output):
@@ -34,31 +39,86 @@ def make_movies(images, save_path):
 #     subprocess.Popen(cmds)  
 
 
-def Mask(frame2, sigma):
-    [xdim,ydim,_]=frame2.shape
-    center = [xdim ,xdim/2]
-    x = np.arange(0, xdim, 1, float)
-    y = x[:,np.newaxis]
-    x0 = center[0]
-    y0 = center[1]
-    grid=np.exp(-4*np.log(2) * ((x-x0)**2 + (y-y0)**2) / sigma**2) 
-    grid=np.delete(grid, list(range(xdim-ydim)), 1)
-    # y = np.expand_dims(grid, axis=3)
-    y = grid[:,:,np.newaxis]
-    y=np.repeat(y,3,axis=2)
-    a = np.array(frame2, dtype=float)
-    a = a*(1-y)
-    img = a.astype(np.uint8)
-    return(img)
+@lru_cache(maxsize=8)
+def gaussian_mask_weights(shape: tuple, sigma) -> np.ndarray:
+    '''
+    Per-pixel weights (1 - gaussian) of Mask for frame shape (rows, cols, channels); cached per (shape, sigma)
+    Gaussian is centered on last row, middle column of the (rows x rows) grid whose first rows-cols columns are dropped
+    Kept float64 (read-only, rows x cols x 1): float32 weights round 1-g to 1.0 far from center and change ~18% of
+    pixels by 1 LSB vs original float64 multiply + truncation
+    '''
+    xdim, ydim = shape[0], shape[1]
+    x = np.arange(xdim - ydim, xdim, 1, float) #SAME COLUMNS AS np.delete(grid, range(xdim-ydim), 1)
+    y = np.arange(0, xdim, 1, float)[:, np.newaxis]
+    grid = np.exp(-4*np.log(2) * ((x-xdim)**2 + (y-xdim/2)**2) / sigma**2)
+    weights = (1 - grid)[:, :, np.newaxis]
+    weights.flags.writeable = False
+    return weights
+
+
+def Mask(frame2, sigma, inplace: bool = False):
+    '''
+    Attenuates frame (uint8, rows x cols x 3) with cached gaussian weights; single multiply, no float frame copy
+    inplace=True overwrites frame2 (must be writable uint8), otherwise a new array is returned
+    '''
+    img = frame2 if inplace else np.array(frame2, dtype=np.uint8)
+    np.multiply(img, gaussian_mask_weights(img.shape, sigma), out=img, casting='unsafe') #TRUNCATES LIKE astype(np.uint8)
+    return img
 
    
-def get_mask_mirror_names(mainfolder):
-    Xfiles = [os.path.join(mainfolder,f) for f in os.listdir(mainfolder) if f.endswith('L.avi') and not f.startswith('Mask') and not f.startswith('Mirror') ] # find all files with R.avi as file name
-    Xfiles2 = [Path(f) for f in Xfiles] # make each file name path to extract the parents and anme
-    XfilesL = [os.path.join(f.parents[0],'Mask'+f.name) for f in Xfiles2] # creat a same as files but with Mirror added to the file names
-    Xfiles = [os.path.join(mainfolder,f) for f in os.listdir(mainfolder) if f.endswith('R.avi') and not f.startswith('Mask') and not f.startswith('Mirror') ] # find all files with R.avi as file name
-    Xfiles2 = [Path(f) for f in Xfiles] # make each file name path to extract the parents and anme
-    XfilesR = [os.path.join(f.parents[0],'Mirror'+f.name) for f in Xfiles2] # creat a same as files but with Mirror added to the file names
+def luminance_mean(frame) -> float:
+    '''
+    Mean of PIL "L" conversion of frame (channels taken in stored order as R, G, B, same as Image.fromarray)
+    L = (R*19595 + G*38470 + B*7471 + 0x8000) >> 16 (ITU-R 601-2, fixed point)
+    '''
+    luminance = frame[:, :, 0].astype(np.uint32)
+    luminance *= 19595
+    luminance += frame[:, :, 1] * np.uint32(38470)
+    luminance += frame[:, :, 2] * np.uint32(7471)
+    luminance += 0x8000
+    luminance >>= 16
+    return float(luminance.sum()) / luminance.size
+
+
+@lru_cache(maxsize=512)
+def contrast_lut(mean: int, factor: float) -> np.ndarray:
+    '''
+    256-entry table of PIL ImageEnhance.Contrast(image).enhance(factor) for image with rounded L mean 'mean'
+    PIL blends with the uniform 'mean' image in float32: trunc(mean + factor*(v - mean)), clipped to [0, 255]
+    '''
+    values = np.arange(256, dtype=np.float32)
+    blended = np.float32(mean) + np.float32(factor) * (values - np.float32(mean))
+    lut = np.clip(blended, 0, 255).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def Contrast(frame, factor, inplace: bool = False):
+    '''
+    NumPy/OpenCV equivalent of np.array(ImageEnhance.Contrast(Image.fromarray(frame)).enhance(factor)) for uint8 3-channel frames
+    inplace=True overwrites frame (must be writable, contiguous uint8)
+    '''
+    img = frame if inplace else np.array(frame, dtype=np.uint8)
+    mean = int(luminance_mean(img) + 0.5)
+    return cv2.LUT(img, contrast_lut(mean, float(factor)), dst=img)
+
+
+def mask_and_contrast(frame, sigma, factor, inplace: bool = False):
+    '''
+    Fused Mask + Contrast on one buffer: gaussian weight multiply, L mean of masked frame, LUT applied in place
+    '''
+    img = Mask(frame, sigma, inplace)
+    return Contrast(img, factor, inplace=True)
+
+
+def get_mask_mirror_names(mainfolder, session_index=None):
+    '''
+    Mask/Mirror output names for left ({trial}L.avi) and right ({trial}R.avi) videos of folder; session_index avoids rescan
+    '''
+    from src.lib.session_index import SessionIndex
+    session_index = session_index or SessionIndex(mainfolder)
+    XfilesL = [os.path.join(f.parent,'Mask'+f.name) for f in session_index.files_with_role('left_video')] # same as left files but with Mask added to the file names
+    XfilesR = [os.path.join(f.parent,'Mirror'+f.name) for f in session_index.files_with_role('right_video')] # same as right files but with Mirror added to the file names
     return XfilesL,XfilesR
 
 def Copyvideodata(source, destination):
@@ -76,14 +136,59 @@ def make_movies_out_of_imagesNocropp(images, video_name,folderi):
     cv2.destroyAllWindows()
 
 def smooth_data_convolve_my_average(arr, span):
-    import numpy as np
-    re = np.convolve(arr, np.ones(span * 2 + 1) / (span * 2 + 1), mode="same")
-    re[0] = np.average(arr[:span])
-    for i in range(1, span + 1):
-        re[i] = np.average(arr[:i + span])
-        re[-i] = np.average(arr[-i - span:])
-    return re
+    return kinematics.smooth_data_convolve_my_average(arr, span)
     
+def split_affine_matrix(frame_shape, angle, nose, col_start, width=315, flip=False, margin=400, midpoint=350, ratsiosize=1.1):
+    '''
+    Single inverse affine matrix (output pixel -> input pixel) equivalent to the chain
+    PIL rotate(angle, expand=True) -> add_margin(margin) -> crop_rotated -> [:, col_start:col_start+width] -> [cv2.flip]
+    for use with cv2.warpAffine(frame, M, (width, 2*midpoint), flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP)
+
+    angle: degrees (counter-clockwise, PIL convention); nose: (x, y) of nose in input frame
+    '''
+    H, W = frame_shape[:2]
+
+    #PIL Image.rotate(expand=True): OUTPUT -> INPUT MATRIX, EXPANDED CANVAS SIZE (nw, nh)
+    a = -math.radians(angle % 360.0)
+    m0, m1 = round(math.cos(a), 15), round(math.sin(a), 15)
+    m3, m4 = round(-math.sin(a), 15), round(math.cos(a), 15)
+    cx, cy = W / 2, H / 2
+    m2 = m0 * -cx + m1 * -cy + cx
+    m5 = m3 * -cx + m4 * -cy + cy
+    xx = [m0 * x + m1 * y + m2 for x, y in ((0, 0), (W, 0), (W, H), (0, H))]
+    yy = [m3 * x + m4 * y + m5 for x, y in ((0, 0), (W, 0), (W, H), (0, H))]
+    nw = math.ceil(max(xx)) - math.floor(min(xx))
+    nh = math.ceil(max(yy)) - math.floor(min(yy))
+    m2, m5 = m0 * -(nw - W) / 2.0 + m1 * -(nh - H) / 2.0 + m2, m3 * -(nw - W) / 2.0 + m4 * -(nh - H) / 2.0 + m5
+
+    #crop_rotated: NOSE POSITION IN PADDED ROTATED IMAGE -> CROP ORIGIN (row y0, col x0)
+    c, s = np.cos(math.radians(angle)), np.sin(math.radians(angle))
+    P = np.array([nose[1], nose[0]]) - np.array([H, W]) / 2
+    RotatedP = np.array(((c, -s), (s, c))).dot(P) + np.array([nh + 2 * margin, nw + 2 * margin]) / 2
+    y0 = int(RotatedP[0] - midpoint)
+    x0 = int(RotatedP[1] - midpoint * ratsiosize)
+
+    #OUTPUT (x, y) -> ROTATED (u, v) = (sx * x + tx, y + ty); FLIP FOLDED INTO SAME MATRIX
+    sx = -1 if flip else 1
+    tx = x0 + col_start - margin + (width - 1 if flip else 0)
+    ty = y0 - margin
+
+    #PIL SAMPLES floor(M @ (u + 0.5, v + 0.5)); cv2 INTER_NEAREST SAMPLES round(M @ (x, y)) -> SHIFT BY -0.5
+    return np.array([
+        [m0 * sx, m1, m0 * (tx + 0.5) + m1 * (ty + 0.5) + m2 - 0.5],
+        [m3 * sx, m4, m3 * (tx + 0.5) + m4 * (ty + 0.5) + m5 - 0.5],
+    ])
+
+
+def warp_split(frame, angle, nose, col_start, width=315, height=700, flip=False):
+    '''
+    Rotation about nose + crop of left/right window in single pass, straight into output-size buffer
+    (out-of-frame pixels are black, same as rotate/add_margin fill)
+    '''
+    M = split_affine_matrix(frame.shape, angle, nose, col_start, width, flip, midpoint=height / 2)
+    return cv2.warpAffine(frame, M, (width, height), flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
 def crop_rotated(rotated,frame,Angle,i,df):
     def add_margin(pil_img, top, right, bottom, left, color):
         width, height = pil_img.size
@@ -0,0 +1,102 @@
+"""
+-Import-time report (like python -X importtime) for start-up regression tracking
+-ImportTimer is a meta path finder installed before pipeline modules are imported; it wraps each module's loader and
+ records self/cumulative exec time per module (nested imports included in cumulative time)
+-report() formats slowest modules for the log file; modules imported later by stages (lazy imports) are recorded too
+"""
+
+import sys
+import threading
+import importlib.abc
+from time import perf_counter
+
+
+class _TimedLoader(importlib.abc.Loader):
+    '''
+    Delegates to original loader; times exec_module
+    '''
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        module.__loader__ = self._loader #MODULE ONLY EVER SEES ITS ORIGINAL LOADER (pkg_resources/importlib.resources LOOKUPS)
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._timer._enter()
+        start = perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer._exit(module.__name__, perf_counter() - start)
+
+    def __getattr__(self, name): #get_data, get_resource_reader, is_package ... OF ORIGINAL LOADER
+        return getattr(self._loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    def __init__(self):
+        self.records = [] #(module name, self seconds, cumulative seconds, nesting depth) IN COMPLETION ORDER
+        self._local = threading.local() #PER THREAD: STAGE/SCHEDULER THREADS IMPORT LAZILY AT THE SAME TIME
+        self._records_lock = threading.Lock()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module') and not isinstance(spec.loader, _TimedLoader):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    @property
+    def _children(self) -> list:
+        '''
+        Cumulative time of nested imports per open level of this thread's import stack
+        '''
+        if not hasattr(self._local, 'children'):
+            self._local.children = [0.0]
+        return self._local.children
+
+    def _enter(self):
+        self._children.append(0.0)
+
+    def _exit(self, name: str, elapsed: float):
+        children = self._children
+        nested = children.pop()
+        children[-1] += elapsed
+        with self._records_lock:
+            self.records.append((name, elapsed - nested, elapsed, len(children) - 1))
+
+    def total(self) -> float:
+        '''
+        Seconds spent importing top-level (non-nested) modules since install
+        '''
+        return sum(cumulative for _, _, cumulative, depth in self.records if depth == 0)
+
+    def report(self, top: int = 15, since: int = 0) -> str:
+        '''
+        Slowest modules (cumulative time) imported after records[since:]; returns multi-line text for log
+        '''
+        records = self.records[since:]
+        total = sum(cumulative for _, _, cumulative, depth in records if depth == 0)
+        lines = [f"IMPORT TIME: {total * 1000:.1f} ms, {len(records)} module(s); slowest (self | cumulative [ms]):"]
+        for name, self_time, cumulative, depth in sorted(records, key=lambda record: record[2], reverse=True)[:top]:
+            lines.append(f"    {self_time * 1000:9.1f} | {cumulative * 1000:9.1f} | {'  ' * depth}{name}")
+        return "\n".join(lines)
@@ -0,0 +1,89 @@
+"""
+-NumPy-vectorized head kinematics from DLC (nose/snout bead) coordinates
+-Shared by ViewParsingManager.readDLCfiles and image_util (previously duplicated, per-frame python loops)
+"""
+
+import math
+from typing import NamedTuple
+import numpy as np
+
+
+def smooth_data_convolve_my_average(arr, span: int) -> np.ndarray:
+    '''
+    Moving average (window 2*span+1); edges averaged over available samples only
+    Edge patch is O(span) (not O(frames)) and kept as np.average calls so results are bit-identical to original helper
+    '''
+    arr = np.asarray(arr, dtype=float)
+    re = np.convolve(arr, np.ones(span * 2 + 1) / (span * 2 + 1), mode="same")
+    re[0] = np.average(arr[:span])
+    for i in range(1, span + 1):
+        re[i] = np.average(arr[:i + span])
+        re[-i] = np.average(arr[-i - span:])
+    return re
+
+
+def head_angles(x1, y1, x2, y2) -> np.ndarray:
+    '''
+    Angle of head (radians) defined by nose (x1, y1) and snout (x2, y2) beads
+    math.atan2 per element (np.arctan2 differs in last bit): bit-identical to original per-frame loop
+    '''
+    dy = -(np.asarray(y1) - np.asarray(y2))
+    dx = -(np.asarray(x1) - np.asarray(x2))
+    return np.fromiter(map(math.atan2, dy.tolist(), dx.tolist()), dtype=float, count=len(dx))
+
+
+def inter_bead_distance(x1, y1, x2, y2) -> np.ndarray:
+    '''
+    Euclidean distance between nose and snout beads: math.sqrt(dx**2 + dy**2) per element, bit-identical to original
+    per-frame loop (input to mindist/maxdist thresholds of find_good_frames); math.hypot / np.hypot round differently
+    '''
+    dx = (np.asarray(x2) - np.asarray(x1)).tolist()
+    dy = (np.asarray(y2) - np.asarray(y1)).tolist()
+    return np.fromiter(map(lambda a, b: math.sqrt(a**2 + b**2), dx, dy), dtype=float, count=len(dx))
+
+
+def good_frame_mask(nose_likelihood, snout_likelihood, distance, min_likelihood: float, mindist: float, maxdist: float) -> np.ndarray:
+    '''
+    Boolean mask of frames where both beads are tracked with min_likelihood and distance is within [mindist, maxdist]
+    '''
+    nose_likelihood = np.asarray(nose_likelihood)
+    snout_likelihood = np.asarray(snout_likelihood)
+    distance = np.asarray(distance)
+    return ~((nose_likelihood < min_likelihood) | (snout_likelihood < min_likelihood) | (distance < mindist) | (distance > maxdist))
+
+
+def compute_kinematics(df, smoothingwin: int = 5) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Smoothed head angle and inter-bead distance per frame
+    df columns: 'Nosex', 'Nosey', 'Snoutx1', 'Snouty1' (see ViewParsingManager.readDLCfiles)
+    '''
+    x1 = smooth_data_convolve_my_average(df.Nosex, smoothingwin)
+    y1 = smooth_data_convolve_my_average(df.Nosey, smoothingwin)
+    x2 = smooth_data_convolve_my_average(df.Snoutx1, smoothingwin)
+    y2 = smooth_data_convolve_my_average(df.Snouty1, smoothingwin)
+    return head_angles(x1, y1, x2, y2), inter_bead_distance(x1, y1, x2, y2)
+
+
+class GoodFrames(NamedTuple):
+    '''
+    mask: bool per frame (1 byte/frame)
+    frame_index: frame numbers of good frames (np.flatnonzero(mask)); consumers iterate only over these
+    '''
+    mask: np.ndarray
+    frame_index: np.ndarray
+
+
+def find_good_frames(nose_likelihood, snout_likelihood, distance, min_likelihood: float, mindist: float, maxdist: float) -> GoodFrames:
+    mask = good_frame_mask(nose_likelihood, snout_likelihood, distance, min_likelihood, mindist, maxdist)
+    return GoodFrames(mask, np.flatnonzero(mask))
+
+
+class TrialKinematics(NamedTuple):
+    '''
+    Parsed DLC csv of one trial + derived kinematics; built once per trial, shared by split and FrameData stages
+    '''
+    df: object #pd.DataFrame: Nosex, Nosey, Noselikelihood, Snoutx1, Snouty1, Snoutlikelihood
+    head_angle: object #pd.Series (radians)
+    inter_bead_distance: np.ndarray
+    filename: str
+    good_frames: GoodFrames
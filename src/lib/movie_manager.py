@@ -1,13 +1,15 @@
-import cv2 
 from pathlib import Path
-import re
-from src.lib.utilities import get_scratch_dir, move_files_in_background, get_nworkers, run_commands_concurrently
-from moviepy import ImageSequenceClip
-from concurrent.futures.process import ProcessPoolExecutor
+from functools import partial
+from src.lib.utilities import get_scratch_dir, move_files_in_background, get_nworkers, imap_bounded
+from src.lib.scheduler import WorkItem, build_work_items
+from src.lib.stage_graph import StageGraph, SESSION_TRIAL
+#DECODERS (cv2) AND ENCODERS (moviepy) ARE IMPORTED BY THE METHODS THAT USE THEM (FAST START-UP)
+
 
 class MovieManager:
     def __init__(self):
-        pass
+        super().__init__() #Pipeline(MovieManager, ViewParsingManager): NEXT IN MRO SETS UP VIEW PARSING STATE (caches, session indexes)
+        self.frame_buffer_warned = False # frame_buffer_size below decoder pool width reported once per run
 
     def process_img_recordings(self, metadata_status):
         if self.debug:
@@ -15,36 +17,47 @@ class MovieManager:
         if self.use_scratch:
             scratch_tmp = get_scratch_dir()
             self.fileLogger.logevent(f"STAGING FOLDER: {scratch_tmp}".ljust(20))
-        
+
+        def get_scratch(folder, session):
+            return Path(scratch_tmp, 'pipeline_behavior', folder, session, 'img_recordings')
+
+        def include_session(folder, session, last_task):
+            if last_task == 'create_json_manifest' or self.task == 'movie_creation':
+                return True
+            print(f'SKIPPING {folder}; MOVIES ALREADY CREATED')
+            return False
+
         for folder, folders_and_last_task in metadata_status.items():
             self.fileLogger.logevent(f"Process img recordings {folder} - {folders_and_last_task}.".ljust(20))
-            
-            #TASK GROUPING FOR SUBFOLDERS / SESSIONS
-            for session, status in folders_and_last_task.items():
-                last_task = status[1]
-                files_cnt = status[0]
-                input = Path(self.base_input_location, folder, session)
-                final_output = input
-                SCRATCH = Path(scratch_tmp, 'pipeline_behavior', folder, session, 'img_recordings')
-
-                if last_task == 'create_json_manifest' or self.task == 'movie_creation':
-                
-                    SCRATCH.mkdir(parents=True, exist_ok=True)
-                    debug = self.debug
-                    files_cnt = files_cnt
-                    
-                    #OUTPUT WILL BE .avi,.mp4 FOR ALL SUBFOLDERS, STORED ON SCRATCH
-                    self.make_movie_for_all_trials(input, SCRATCH, files_cnt, debug)
-
-                    meta_data_filename = Path(final_output, "meta-data.json")
-                    self.fileLogger.update_individual_json_manifest(meta_data_filename, 'movie_creation')
-                else:
-                    print(f'SKIPPING {folder}; MOVIES ALREADY CREATED')
-                    
-                if self.task == 'movie_creation':
-                    print(f'MOVING PREVIOUSLY-CREATED MOVIES FROM {SCRATCH} TO FINAL OUTPUT FOLDER: {final_output}')
-                    move_files_in_background('.avi', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
-                    move_files_in_background('.mp4', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+
+        #ALL TRIALS OF ALL SESSIONS QUEUED AT ONCE; OUTPUT WILL BE .avi,.mp4 FOR ALL SUBFOLDERS, STORED ON SCRATCH
+        work_items, sessions = build_work_items(metadata_status, self.base_input_location, get_scratch, include_session)
+        for SCRATCH in {item.output for item in work_items}:
+            SCRATCH.mkdir(parents=True, exist_ok=True)
+
+        def on_session_complete(folder, session, results):
+            #CALLED IN SESSION ORDER, AFTER ALL TRIALS OF SESSION ARE DONE
+            final_output = Path(self.base_input_location, folder, session)
+            SCRATCH = get_scratch(folder, session)
+            meta_data_filename = Path(final_output, "meta-data.json")
+            self.fileLogger.update_individual_json_manifest(meta_data_filename, 'movie_creation')
+
+            if self.task == 'movie_creation' or self.perspective != 'top':
+                #RAW FRAME STORES ARE ONLY READ BY TOP VIEW SPLIT: NO CONSUMER, FREE SCRATCH NOW
+                from src.lib.frame_source import remove_frame_stores
+                remove_frame_stores(SCRATCH)
+
+            if self.task == 'movie_creation':
+                print(f'MOVING PREVIOUSLY-CREATED MOVIES FROM {SCRATCH} TO FINAL OUTPUT FOLDER: {final_output}')
+                move_files_in_background('.avi', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+                move_files_in_background('.mp4', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+
+        def on_error(item, e):
+            self.fileLogger.logevent(f"ERROR: movie creation failed for {item.folder}/{item.session} trial {item.trial}: {e}".ljust(20))
+
+        self.select_jpeg_decoder(work_items)
+        #SESSIONS WITHOUT TRIAL FOLDERS ARE STILL COMPLETED (meta-data.json -> movie_creation)
+        self.scheduler.run('movie_creation', work_items, self.make_trial_movie, on_session_complete, on_error, sessions)
 
 
     def make_movie_for_all_trials(self, input: Path, SCRATCH: Path, files_cnt: int, debug: bool):
@@ -54,38 +67,47 @@ class MovieManager:
         if debug:
             print(f'DEBUG: MovieManager::make_movie_for_all_trials')
 
-        for trial in range(files_cnt):
-            img_trial_folder = Path(input, str(trial))
-            self.make_and_convert_movie(img_trial_folder, SCRATCH, debug)
-    
+        work_items = [
+            WorkItem(input.parent.name, input.name, trial, Path(input, str(trial)), SCRATCH)
+            for trial in range(files_cnt)
+        ]
+        self.select_jpeg_decoder(work_items)
+        self.scheduler.run('movie_creation', work_items, self.make_trial_movie)
+
+
+    def make_trial_movie(self, work_item: WorkItem):
+        '''
+        Scheduler task: movies for single (folder, session, trial) work item
+        '''
+        self.make_and_convert_movie(work_item.input, work_item.output, self.debug)
+
 
     def make_and_convert_movie(self, img_trial_folder: Path, SCRATCH: Path, debug: bool):
         '''
         Creates AVI and MP4 movies from images in the specified trial folder.
+        Skipped if both movies were completed before from the unchanged trial folder (stage fingerprints); a movie left
+        incomplete by an interrupted run is recreated
         '''
         avi_filename = Path(img_trial_folder).name
         staging_location = str(Path(SCRATCH, avi_filename + '.avi'))
-        if not Path(staging_location).is_file():
+        inputs = [Path(img_trial_folder)]
+        outputs = [Path(name) for name, *_ in self.trial_movie_outputs(staging_location)]
+        trial = int(avi_filename) if avi_filename.isdigit() else SESSION_TRIAL
+        stage_graph = StageGraph(SCRATCH, self.fileLogger.session_state, debug=debug)
+        if not stage_graph.is_fresh('movie_creation', trial, inputs, outputs):
             self.concat_images_to_movie(img_trial_folder, staging_location, debug)
+            stage_graph.record('movie_creation', trial, inputs, outputs)
         
 
     def concat_images_to_movie(self, image_dir: str, avi_name: str, debug: bool):
         '''
         Concatenates images into an .avi and .mp4 files
         '''
-        if not debug:
-            workers = get_nworkers()
-        else:
-            workers = 1
-
-        mp4_name = Path(avi_name).with_suffix('.mp4')
+        from src.lib.tasks import decode_images
+        from src.lib.frame_decoder import get_decoder
+        workers = self.executor_service.stage_budget.get('decode', get_nworkers())
 
-        image_extensions = ('.jpg', '.jpeg', '.JPG', '.JPEG')
-        # Sort images by numeric value in the filename (USES NATURAL SORT)
-        images = sorted(
-            [str(f) for f in Path(image_dir).iterdir() if f.suffix.lower() in image_extensions],
-            key=lambda x: [int(c) if c.isdigit() else c.lower() for c in re.split(r'(\d+)', x)]
-        )
+        images = self.list_trial_images(image_dir)
 
         if not images:
             self.fileLogger.logevent(f"No images found in {image_dir}".ljust(20))
@@ -95,49 +117,93 @@ class MovieManager:
                 print(f'Concatenating images from {image_dir} to {avi_name}')
         
         # Read the first image to get dimensions
-        frame = cv2.imread(images[0])
+        frame = get_decoder(self.jpeg_decoder).decode(images[0])
         if frame is None:
             self.fileLogger.logevent(f"Unable to read image: {images[0]}".ljust(20))
             return
             
-        # Use concurrent processing to read images
-        with ProcessPoolExecutor(max_workers=workers) as executor:
-            frames = list(executor.map(self.read_image_with_path, images))
-        
-        frames = [frame for _, frame in frames if frame is not None]
-
+        height, width, _ = frame.shape
+
+        video_info = self.trial_movie_outputs(avi_name)
+
+        #STREAMING: DECODER POOL FEEDS ENCODERS IN ORDER THROUGH A BOUNDED BUFFER (PEAK MEMORY ~ buffer_size FRAMES, NOT TRIAL LENGTH)
+        #BATCHED DECODE: ONE TASK PER decode_batch_size IMAGES
+        #CONFIGURED frame_buffer_size IS HONOURED; BELOW 2 x DECODER WORKERS NOT ALL WORKERS CAN BE KEPT BUSY
+        buffer_size = self.frame_buffer_size
+        if buffer_size < 2 * workers and not self.frame_buffer_warned:
+            self.frame_buffer_warned = True
+            self.fileLogger.logevent(f"WARNING: frame_buffer_size={buffer_size} < 2 x decode workers ({2 * workers}); decoder pool underused".ljust(20))
+        batch_size = max(1, self.decode_batch_size)
+        batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+        decode_task = partial(decode_images, backend=self.jpeg_decoder)
+        executor = self.executor_service.process_pool('decode') #PIPELINE-WIDE DECODER POOL SHARED BY ALL CONCURRENT TRIALS
+        decoded_batches = imap_bounded(executor, decode_task, batches, max(2, buffer_size // batch_size))
+        frames = (frame for batch in decoded_batches for _, frame in batch if frame is not None)
+        self.write_video_stream(frames, video_info, (width, height))
+
+
+    def trial_movie_outputs(self, avi_name) -> list[tuple[str, str, int]]:
+        '''
+        (filename, format, fps) of trial: {trial}.avi in top_video_format (lossless by default; read by pose estimation and
+        split), {trial}.mp4, optional uncompressed {trial}_raw.avi (raw_avi_export), optional raw frame store
+        {trial}.frames on scratch (write_frame_store; random access for split, see frame_source)
+        '''
+        avi_name = Path(avi_name)
         video_info = [
-            (str(avi_name), 'avi', 40, frames),
-            (str(mp4_name), 'mp4', 40, frames)
+            (str(avi_name), self.top_video_format, 40),
+            (str(avi_name.with_suffix('.mp4')), 'mp4', 40)
         ]
-        
-        run_commands_concurrently(self.write_video, video_info, workers)
+        if self.raw_avi_export and self.top_video_format != 'avi':
+            video_info.append((str(avi_name.with_name(f'{avi_name.stem}_raw.avi')), 'avi', 40))
+        if self.write_frame_store:
+            video_info.append((str(avi_name.with_suffix('.frames')), 'frames', 40))
+        return video_info
+
+
+    def list_trial_images(self, image_dir: str) -> list[str]:
+        '''
+        JPEG images of single trial folder (natural sort)
+        '''
+        from src.lib.frame_source import list_trial_images
+        return list_trial_images(image_dir)
+
+
+    def select_jpeg_decoder(self, work_items: list[WorkItem]):
+        '''
+        jpeg_decoder == 'auto': micro-benchmark of available backends (opencv, pillow, turbojpeg) on a few images
+        of first trial; fastest is used for rest of run
+        '''
+        if self.jpeg_decoder != 'auto':
+            return self.jpeg_decoder
+        from src.lib.frame_decoder import select_fastest_decoder
+        sample_images = []
+        for item in work_items:
+            if Path(item.input).is_dir():
+                sample_images = self.list_trial_images(item.input)[:8]
+                if sample_images:
+                    break
+        self.jpeg_decoder, timings = select_fastest_decoder(sample_images)
+        timings = {backend: f'{seconds * 1000:.2f} ms' for backend, seconds in timings.items()}
+        self.fileLogger.logevent(f"JPEG DECODER: {self.jpeg_decoder} (benchmark per image: {timings})".ljust(20))
+        return self.jpeg_decoder
 
 
     def read_image_with_path(self, image_path: str):
         '''
         Read an image from the given path and return it with its path.
-        Expected usage in parallel processing.
         '''
-        return (image_path, cv2.imread(image_path))
+        from src.lib.tasks import read_image_with_path
+        return read_image_with_path(image_path)
     
 
-    def write_video(self, video_info: tuple[str, str, int, list]) -> str:
+    def write_video_stream(self, frames, video_info: list[tuple[str, str, int]], size: tuple[int, int]) -> list[str]:
         ''' 
-        Write a video file from the given frames.
+        Write video files from the given frames (any iterable; consumed once).
+        Single decode, multi-encode: every frame is fanned out to one sink (ffmpeg encoder) per entry in video_info.
+        Additional outputs (e.g. preview) only add their own encode time.
         '''
-        output_filename, format_type, fps, frames = video_info
-        
-        # Create a clip from the image sequence
-        clip = ImageSequenceClip(frames, fps=fps)
-        
-        # Set the codec based on format type
-        if format_type == 'avi':
-            moviepy_codec = 'rawvideo' 
-        elif format_type == 'mp4':
-            moviepy_codec = 'libx264'  # Use 'libx264' codec for MP4
-        else:
-            raise ValueError(f"Unsupported format type: {format_type}")
-
-        clip.write_videofile(output_filename, codec=moviepy_codec)
-        return f"Video creation completed: {output_filename}"
\ No newline at end of file
+        from src.lib.video_sinks import make_sink, FanOutWriter
+        sinks = [make_sink(output_filename, format_type, fps, size) for output_filename, format_type, fps in video_info]
+        with FanOutWriter(sinks, queue_size=self.frame_buffer_size) as writer:
+            writer.write_all(frames)
+        return [f"Video creation completed: {output_filename}" for output_filename, *_ in video_info]
@@ -0,0 +1,106 @@
+"""
+-Pluggable pose-estimation backends: analyze videos -> per-frame keypoints (x, y, likelihood) per bodypart
+-Outputs are written next to each video in DeepLabCut layout ({stem}{scorer}_filtered.csv with scorer/bodyparts/coords
+ header rows) so ViewParsingManager.readDLCfiles and later stages work unchanged
+-'deeplabcut' imports deeplabcut lazily (first analyze call), not at pipeline start-up
+-'synthetic' writes deterministic keypoints (seeded by video name) without a trained model; used to profile
+ split/crop/FrameData end to end on a CPU-only box
+"""
+
+import time
+import zlib
+from pathlib import Path
+import cv2
+import numpy as np
+import pandas as pd
+
+
+class DeepLabCutBackend:
+    name = 'deeplabcut'
+
+    def analyze(self, config, videos: list[str], shuffle: int = 1, batch_size: int = None) -> str:
+        '''
+        Single analyze_videos call for all videos (model loaded once), then filterpredictions
+        Returns DLC scorer name ({stem}{scorer}.h5/.csv, {stem}{scorer}_filtered.csv)
+        '''
+        import deeplabcut #LAZY: TENSORFLOW/PYTORCH IMPORT TAKES SECONDS
+        scorer = deeplabcut.analyze_videos(str(config), videos, shuffle=shuffle, save_as_csv=True, batchsize=batch_size)
+        deeplabcut.filterpredictions(str(config), videos, shuffle=shuffle, save_as_csv=True)
+        return scorer
+
+
+class SyntheticBackend:
+    '''
+    Smooth random-walk head track per video: nose near frame center, following bodyparts every 30 px along slowly varying head angle
+    Same video name + seed -> same keypoints; likelihoods mostly above 0.7 (some frames rejected by find_good_frames)
+    frame_delay: seconds per frame (simulated inference time, e.g. to profile stage overlap)
+    '''
+    name = 'synthetic'
+
+    def __init__(self, bodyparts: tuple = ('nose', 'snout'), seed: int = 0, frame_delay: float = 0.0):
+        self.bodyparts = bodyparts
+        self.seed = seed
+        self.frame_delay = frame_delay
+
+    def analyze(self, config, videos: list[str], shuffle: int = 1, batch_size: int = None) -> str:
+        scorer = f'DLC_synthetic_shuffle{shuffle}'
+        for video in videos:
+            video = Path(video)
+            keypoints = self.keypoints(video, *video_geometry(video))
+            if self.frame_delay:
+                time.sleep(self.frame_delay * len(keypoints))
+            write_dlc_csv(keypoints, scorer, Path(video.parent, f'{video.stem}{scorer}_filtered.csv'))
+        return scorer
+
+    def keypoints(self, video: Path, frame_count: int, width: int, height: int) -> pd.DataFrame:
+        rng = np.random.default_rng([self.seed, zlib.crc32(video.name.encode())])
+        nose = np.cumsum(rng.normal(0, 1.5, (frame_count, 2)), axis=0) + (width / 2, height / 2)
+        nose = np.clip(nose, (0, 0), (width - 1, height - 1))
+        angle = np.cumsum(rng.normal(0, 0.05, frame_count)) + rng.uniform(-np.pi, np.pi)
+        columns = {}
+        for part_index, bodypart in enumerate(self.bodyparts):
+            distance = 30 * part_index #BODYPARTS SPACED ALONG HEAD AXIS
+            columns[(bodypart, 'x')] = nose[:, 0] + distance * np.cos(angle)
+            columns[(bodypart, 'y')] = nose[:, 1] + distance * np.sin(angle)
+            columns[(bodypart, 'likelihood')] = np.clip(rng.normal(0.95, 0.1, frame_count), 0, 1)
+        return pd.DataFrame(columns)
+
+
+def video_geometry(video: Path) -> tuple[int, int, int]:
+    '''
+    (frame count, width, height) of video; frame count by grab() if container does not report it
+    '''
+    cap = cv2.VideoCapture(str(video))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if frame_count <= 0:
+        frame_count = 0
+        while cap.grab():
+            frame_count += 1
+    cap.release()
+    return frame_count, width, height
+
+
+def write_dlc_csv(keypoints: pd.DataFrame, scorer: str, output_filename: Path):
+    '''
+    Writes (bodypart, coord) columns as DeepLabCut csv: scorer / bodyparts / coords header rows, frame number index
+    '''
+    columns = pd.MultiIndex.from_tuples([(scorer, *column) for column in keypoints.columns], names=['scorer', 'bodyparts', 'coords'])
+    pd.DataFrame(keypoints.to_numpy(), columns=columns).to_csv(output_filename)
+
+
+POSE_BACKENDS = {
+    DeepLabCutBackend.name: DeepLabCutBackend,
+    SyntheticBackend.name: SyntheticBackend,
+}
+
+_instances = {} #ONE BACKEND INSTANCE PER NAME PER PROCESS
+
+
+def get_pose_backend(backend: str = 'deeplabcut'):
+    if backend not in POSE_BACKENDS:
+        raise ValueError(f"Unsupported pose backend: {backend}; choose from {list(POSE_BACKENDS)}")
+    if backend not in _instances:
+        _instances[backend] = POSE_BACKENDS[backend]()
+    return _instances[backend]
@@ -0,0 +1,123 @@
+"""
+-Global (folder, session, trial) work scheduler
+-Trials from all sessions are queued at once on persistent pools sized by per-stage CPU budget;
+ per-session completion (e.g. meta-data.json manifest updates) is reported in session order
+"""
+
+from pathlib import Path
+from typing import NamedTuple
+from concurrent.futures import Future
+
+from src.lib.utilities import get_nworkers, get_available_memory_mb
+from src.lib.executor_service import ExecutorService
+
+
+class WorkItem(NamedTuple):
+    folder: str
+    session: str
+    trial: int
+    input: Path
+    output: Path
+
+
+def get_stage_budget(cpu_cores: int = None, split_worker_memory_mb: int = 2048) -> dict:
+    '''
+    CPU budget (max concurrent workers) per pipeline stage
+    'decode': processes in shared JPEG decoder pool
+    'movie_creation': trials processed concurrently (each runs 1 ffmpeg encoder per output)
+    'split': processes splitting left/right / writing FrameData of top view trials; also capped by available memory
+    (split_worker_memory_mb per worker)
+    '''
+    if cpu_cores is None:
+        cpu_cores = get_nworkers()
+    available_mb = get_available_memory_mb()
+    split_workers = cpu_cores if available_mb is None else min(cpu_cores, available_mb // split_worker_memory_mb)
+    return {
+        'decode': cpu_cores,
+        'movie_creation': max(1, cpu_cores // 8),
+        'split': max(1, split_workers),
+    }
+
+
+def build_work_items(metadata_status: dict, input_root: Path, output_location, include=None) -> tuple[list[WorkItem], list[tuple]]:
+    '''
+    Flattens metadata_status {folder: {session: [folder_cnt, last_task]}} to list of per-trial work items
+    (sessions in metadata_status order, trials in numeric order)
+    Returns (work items, [(folder, session)] of included sessions, incl. sessions without trials)
+
+    'output_location': callable(folder, session) -> Path (e.g. SCRATCH folder of session)
+    'include' (optional): callable(folder, session, last_task) -> bool; sessions returning False are skipped
+    '''
+    work_items = []
+    included_sessions = []
+    for folder, sessions in metadata_status.items():
+        for session, status in sessions.items():
+            files_cnt, last_task = status[0], status[1]
+            if include is not None and not include(folder, session, last_task):
+                continue
+            included_sessions.append((folder, session))
+            output = output_location(folder, session)
+            for trial in range(files_cnt):
+                work_items.append(WorkItem(folder, session, trial, Path(input_root, folder, session, str(trial)), output))
+    return work_items, included_sessions
+
+
+class TrialScheduler:
+    '''
+    Runs work items on persistent pools of the pipeline-wide ExecutorService
+
+    Thread pool per stage runs per-trial orchestration (I/O, ffmpeg pipes); CPU-bound work is handed to
+    process pools of the same service (e.g. 'decode'), which live for the whole pipeline run
+
+    debug=True runs every trial sequentially in calling thread (errors shown on stdout)
+    '''
+
+    def __init__(self, executor_service: ExecutorService, debug: bool = False):
+        self.executor_service = executor_service
+        self.debug = debug
+
+    def run(self, stage: str, work_items: list[WorkItem], function, on_session_complete=None, on_error=None, sessions: list[tuple] = None) -> dict:
+        '''
+        Runs function(work_item) for all work items on stage pool
+
+        on_session_complete(folder, session, results) is called in calling thread once all trials of session
+        have finished, in session order (order of first appearance in work_items); sessions with failed trials
+        are reported to on_error(work_item, exception) instead
+        sessions (optional): [(folder, session)] in report order; sessions without work items complete with results []
+        Returns {(folder, session): [result per trial]}
+        '''
+        sessions = {key: [] for key in (sessions or [])}
+        for item in work_items:
+            sessions.setdefault((item.folder, item.session), []).append(item)
+
+        if self.debug:
+            futures = {key: [self._run_now(function, item) for item in items] for key, items in sessions.items()}
+        else:
+            executor = self.executor_service.thread_pool(stage)
+            futures = {key: [executor.submit(function, item) for item in items] for key, items in sessions.items()}
+
+        session_results = {}
+        for (folder, session), session_futures in futures.items():
+            results = []
+            failed = False
+            for item, future in zip(sessions[(folder, session)], session_futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    failed = True
+                    if on_error is not None:
+                        on_error(item, e)
+                    else:
+                        raise
+            session_results[(folder, session)] = results
+            if not failed and on_session_complete is not None:
+                on_session_complete(folder, session, results)
+        return session_results
+
+    def _run_now(self, function, item) -> Future:
+        future = Future()
+        try:
+            future.set_result(function(item))
+        except Exception as e:
+            future.set_exception(e)
+        return future
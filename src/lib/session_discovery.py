@@ -0,0 +1,268 @@
+"""
+-Incremental discovery of sessions to process under base_input_location (NFS): builds metadata_status
+ {animal folder: {session: [folder_cnt, last_task]}} and maintains status.json / meta-data.json like before
+-Local discovery cache (scratch) remembers directory mtimes, status.json stat and content, meta-data.json presence:
+    -base folder mtime unchanged -> animal folders not relisted
+    -animal folder mtime + status.json (mtime, size) unchanged -> status.json not read, sessions not relisted
+    -session folder mtime unchanged -> trial folders not recounted
+    -processed sessions are never stat'ed/listed (pruned); sessions added later change animal folder mtime -> merged in
+-Directory mtime changes on entry add/remove/rename, not on file content changes; status.json/meta-data.json content is
+ tracked by stat / re-read instead
+-status.json is only rewritten when its content changes (atomically)
+-Filesystem calls are issued concurrently (bounded thread pool), see SessionDiscovery
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.lib.session_state import write_json_atomic
+from src.lib.utilities import get_scratch_dir
+
+
+CACHE_VERSION = 1
+
+
+def list_subfolders(path: Path) -> list[str]:
+    '''
+    Names of subfolders (single scandir; d_type avoids per-entry stat on most filesystems)
+    '''
+    with os.scandir(path) as entries:
+        return [entry.name for entry in entries if entry.is_dir()]
+
+
+def mtime_ns(path: Path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def file_stat(path: Path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def get_discovery_cache_file(base_input_location) -> Path:
+    '''
+    Local (scratch) cache file per base_input_location
+    '''
+    key = hashlib.md5(str(Path(base_input_location)).encode()).hexdigest()[:16]
+    return Path(get_scratch_dir(), 'pipeline_behavior', 'discovery', f'{key}.json')
+
+
+class SessionDiscovery:
+    '''
+    Filesystem calls run concurrently on a thread pool (NFS: each stat/listing is a round trip), in three phases
+    with at most 'workers' calls in flight: animal folders (stat, status.json, listing) -> sessions (stat, trial
+    count, meta-data.json) -> status.json writes; assembled in listing order, same result as serial (workers=1)
+    '''
+    def __init__(self, file_logger, base_input_location, debug: bool = False, cache_file: Path = None, workers: int = 16):
+        self.file_logger = file_logger
+        self.base = Path(base_input_location)
+        self.debug = debug
+        self.workers = max(1, workers)
+        self.cache_file = Path(cache_file) if cache_file else get_discovery_cache_file(self.base)
+        self.cache = self.load_cache()
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    def load_cache(self) -> dict:
+        try:
+            with open(self.cache_file, 'r') as cache_file:
+                cache = json.load(cache_file)
+            if cache.get('version') == CACHE_VERSION and cache.get('base') == str(self.base):
+                return cache
+        except (OSError, ValueError):
+            pass
+        return {'version': CACHE_VERSION, 'base': str(self.base), 'base_mtime': None, 'animal_folders': [], 'animals': {}}
+
+    def save_cache(self):
+        '''
+        Atomic replace; discovery still works (uncached) if scratch is not writable
+        '''
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp_file, 'w') as cache_file:
+                json.dump(self.cache, cache_file)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            print(f'Unable to save discovery cache {self.cache_file}: {e}')
+
+    def map(self, function, items: list) -> list:
+        '''
+        Results in order of items; bounded concurrency (workers threads)
+        '''
+        if self.workers == 1 or len(items) < 2:
+            return [function(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as executor:
+            return list(executor.map(function, items))
+
+    def count(self, stat: str):
+        with self.stats_lock:
+            self.stats[stat] += 1
+
+    def animal_folders(self) -> list[str]:
+        base_mtime = mtime_ns(self.base)
+        if base_mtime is not None and base_mtime == self.cache['base_mtime']:
+            return self.cache['animal_folders']
+        animal_folders = list_subfolders(self.base)
+        self.cache['base_mtime'] = base_mtime
+        self.cache['animal_folders'] = animal_folders
+        return animal_folders
+
+    def run(self) -> dict:
+        #PHASE 1: ANIMAL FOLDERS
+        animal_folders = self.animal_folders()
+        animals = [animal for animal in self.map(self.probe_animal, animal_folders) if animal is not None]
+
+        #PHASE 2: SESSIONS OF ALL ANIMALS (NEW OR NOT PROCESSED)
+        session_jobs = [
+            (animal, name)
+            for animal in animals
+            for name, info in animal['status'].items()
+            if name in animal['new'] or info.get("processed", False) is False
+        ]
+        for (animal, name), result in zip(session_jobs, self.map(self.probe_session, session_jobs)):
+            animal['sessions'][name] = result
+
+        #PHASE 3: ASSEMBLE (LISTING ORDER), WRITE CHANGED status.json
+        subfolder_counts = {}
+        for animal in animals:
+            sessions = self.assemble_animal(animal)
+            if sessions:
+                subfolder_counts[animal['name']] = sessions
+        entries = self.map(self.write_status, animals)
+        self.cache['animals'] = {animal['name']: entry for animal, entry in zip(animals, entries)} #FOLDERS REMOVED FROM BASE ARE DROPPED
+        self.save_cache()
+        if self.debug:
+            print(f'DEBUG: SessionDiscovery {dict(self.stats)}')
+        return subfolder_counts
+
+    def probe_animal(self, animal_name: str):
+        '''
+        status.json content (from cache if folder + status.json unchanged) reconciled with session folders on disk:
+        new sessions added (to be counted in phase 2), removed sessions dropped, existing entries kept as stored
+        '''
+        dir_name = Path(self.base, animal_name)
+        status_json_path = dir_name / "status.json"
+        animal_mtime = mtime_ns(dir_name)
+        if animal_mtime is None:
+            return None
+        status_stat = file_stat(status_json_path)
+        cached = self.cache['animals'].get(animal_name, {})
+        animal = {
+            'name': animal_name, 'path': dir_name, 'mtime': animal_mtime, 'cached_sessions': cached.get('sessions', {}),
+            'new': set(), 'sessions': {}, 'changed': False,
+        }
+
+        if status_stat is not None and cached.get('mtime') == animal_mtime and cached.get('status_stat') == status_stat:
+            #NOTHING ADDED/REMOVED, status.json UNCHANGED SINCE LAST RUN
+            animal['status'] = cached['status']
+            return animal
+
+        if status_stat is not None:
+            if self.debug:
+                print(f'status.json exists for {dir_name}')
+            self.count('status_read')
+            with open(status_json_path, 'r') as status_file:
+                stored_subfolders = json.load(status_file)
+        else:
+            print(f'Creating status.json in {dir_name.name}')
+            stored_subfolders = {}
+            animal['changed'] = True
+
+        self.count('animals_listed')
+        current_subfolders = list_subfolders(dir_name)
+        merged = {name: info for name, info in stored_subfolders.items() if name in current_subfolders}
+        for name in current_subfolders:
+            if name not in merged:
+                merged[name] = {"processed": False, "folder_cnt": 0} #FILLED IN PHASE 2
+                animal['new'].add(name)
+        if merged.keys() != stored_subfolders.keys():
+            animal['changed'] = True
+            if stored_subfolders:
+                print(f"Subfolders have changed in {dir_name.name}. Updating status.json.")
+        animal['status'] = merged
+        return animal
+
+    def probe_session(self, job: tuple) -> dict:
+        '''
+        New session: processed = meta-data.json exists, trial folders counted
+        Not processed: trial folders recounted if session folder changed; last_task from meta-data.json (created if missing)
+        '''
+        animal, name = job
+        subfolder = Path(animal['path'], name)
+        meta_data_filename = Path(subfolder, "meta-data.json")
+        new = name in animal['new']
+        session_mtime = mtime_ns(subfolder)
+        if session_mtime is None:
+            return {'mtime': None}
+        cached_session = animal['cached_sessions'].get(name, {})
+        unchanged = not new and cached_session.get('mtime') == session_mtime
+
+        result = {'mtime': session_mtime, 'folder_cnt': None, 'task': None}
+        trial_folders = None
+        if not unchanged:
+            self.count('sessions_counted')
+            trial_folders = list_subfolders(subfolder) #TRIAL FOLDERS ADDED/REMOVED
+            result['folder_cnt'] = len(trial_folders)
+        meta_exists = cached_session.get('meta') if unchanged else meta_data_filename.exists()
+        if new:
+            result['processed'] = meta_exists
+            if meta_exists:
+                return result #ALREADY PROCESSED WHEN FIRST SEEN
+
+        if meta_exists:
+            result['task'] = self.file_logger.read_individual_json_manifest(meta_data_filename, self.debug)
+        else:
+            if self.debug:
+                print(f'{meta_data_filename} does not exist. Creating')
+            result['task'] = self.file_logger.create_individual_json_manifest(meta_data_filename, subfolder, self.debug, trial_folders)
+            result['mtime'] = mtime_ns(subfolder) #meta-data.json ADDED TO SESSION FOLDER
+        return result
+
+    def assemble_animal(self, animal: dict) -> dict:
+        '''
+        Applies phase 2 results to status.json content; returns {session: [folder_cnt, last_task]} of unprocessed sessions with trials
+        '''
+        sessions = {}
+        animal['session_entries'] = {}
+        for subfolder_name, subfolder_info in animal['status'].items():
+            result = animal['sessions'].get(subfolder_name)
+            if result is None or result['mtime'] is None:
+                continue #FULLY PROCESSED: PRUNED (NO STAT/LISTING)
+            if 'processed' in result:
+                subfolder_info["processed"] = result['processed']
+            if result['folder_cnt'] is not None and result['folder_cnt'] != subfolder_info.get("folder_cnt"):
+                subfolder_info["folder_cnt"] = result['folder_cnt']
+                animal['changed'] = True
+            if subfolder_info["processed"] is not False:
+                continue
+            animal['session_entries'][subfolder_name] = {'mtime': result['mtime'], 'meta': True}
+            if subfolder_info.get("folder_cnt", 0) > 0:
+                sessions[subfolder_name] = [subfolder_info["folder_cnt"], result['task']]
+        return sessions
+
+    def write_status(self, animal: dict) -> dict:
+        '''
+        Writes status.json if content changed; returns cache entry of animal folder
+        '''
+        status_json_path = Path(animal['path'], "status.json")
+        if animal['changed']:
+            self.count('status_written')
+            write_json_atomic(status_json_path, animal['status'])
+        return {
+            'mtime': mtime_ns(animal['path']) if animal['changed'] else animal['mtime'], #OWN WRITES MAY TOUCH FOLDER
+            'status_stat': file_stat(status_json_path),
+            'status': animal['status'],
+            'sessions': animal['session_entries'],
+        }
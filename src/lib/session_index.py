@@ -0,0 +1,93 @@
+"""
+-File index of a session folder (SCRATCH/img_recordings): one os.scandir, every file classified by role
+ (raw top video, DLC csv, Mask/Mirror video, h5, pickle, FrameData, ...) and trial number
+-Stages look files up in the index instead of os.listdir + regex per call (readDLCfiles did so twice per trial)
+-Kept up to date incrementally: add()/remove() for outputs a stage writes itself, rescan() after external tools
+ (DeepLabCut) write files with names not known in advance
+"""
+
+import os
+import re
+import threading
+from pathlib import Path
+
+
+#FIRST MATCHING ROLE WINS; 'trial' GROUP (IF ANY) IS TRIAL NUMBER
+ROLE_PATTERNS = [
+    ('top_video', re.compile(r'^(?P<trial>\d+)\.avi$')),
+    ('mask_video', re.compile(r'^Mask(?P<trial>\d*).*\.avi$')),
+    ('mirror_video', re.compile(r'^Mirror(?P<trial>\d*).*\.avi$')),
+    ('left_video', re.compile(r'^(?P<trial>\d*).*L\.avi$')),
+    ('right_video', re.compile(r'^(?P<trial>\d*).*R\.avi$')),
+    ('top_video_mp4', re.compile(r'^(?P<trial>\d+)\.mp4$')),
+    ('frame_store', re.compile(r'^(?P<trial>\d+)\.frames$')), #RAW FRAMES OF TOP VIEW VIDEO (SCRATCH ONLY)
+    ('dlc_filtered_csv', re.compile(r'^(?P<trial>\d+)DLC.*filtered\.csv')), #TOP VIEW POSE, INPUT OF SPLIT/FrameData
+    ('dlc_csv', re.compile(r'^(?P<trial>\d+)DLC.*\.csv$')),
+    ('view_dlc_csv', re.compile(r'^(?:Mask|Mirror)(?P<trial>\d+).*DLC.*\.csv$')), #LEFT/RIGHT (WHISKER) POSE
+    ('h5', re.compile(r'^(?:Mask|Mirror)?(?P<trial>\d*).*\.h5$')),
+    ('pickle', re.compile(r'^(?:Mask|Mirror)?(?P<trial>\d*).*\.pickle$')),
+    ('frame_data', re.compile(r'^(?P<trial>\d*)FrameData\.(?:parquet|npz|xlsx)$')),
+]
+
+
+def classify(name: str) -> tuple[str, int | None]:
+    '''
+    (role, trial) of file name; ('other', None) if no role matches
+    '''
+    for role, pattern in ROLE_PATTERNS:
+        match = pattern.match(name)
+        if match:
+            trial = match.group('trial')
+            return role, int(trial) if trial else None
+    return 'other', None
+
+
+class SessionIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.files = {} #{name: (role, trial)}
+        self.rescan()
+
+    @staticmethod
+    def trial_of(filename) -> int | None:
+        return classify(Path(filename).name)[1]
+
+    def rescan(self):
+        '''
+        Rebuilds index with one os.scandir of session folder (regular files only)
+        '''
+        with self.lock: #HELD DURING SCAN: add() BY A CONCURRENT STAGE IS NOT LOST
+            files = {}
+            if self.path.is_dir():
+                with os.scandir(self.path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            files[entry.name] = classify(entry.name)
+            self.files = files
+
+    def add(self, filename):
+        name = Path(filename).name
+        with self.lock:
+            self.files[name] = classify(name)
+
+    def remove(self, filename):
+        with self.lock:
+            self.files.pop(Path(filename).name, None)
+
+    def files_with_role(self, role: str) -> list[Path]:
+        '''
+        Files of role, ordered by trial number then name
+        '''
+        with self.lock:
+            names = [(trial if trial is not None else -1, name) for name, (file_role, trial) in self.files.items() if file_role == role]
+        return [Path(self.path, name) for _, name in sorted(names)]
+
+    def trial_files(self, role: str, trial: int) -> list[Path]:
+        with self.lock:
+            names = sorted(name for name, (file_role, file_trial) in self.files.items() if file_role == role and file_trial == trial)
+        return [Path(self.path, name) for name in names]
+
+    def trials(self, role: str = 'top_video') -> list[int]:
+        with self.lock:
+            return sorted({trial for file_role, trial in self.files.values() if file_role == role and trial is not None})
@@ -0,0 +1,188 @@
+"""
+-Session state store: stage transitions (meta-data.json last_task, status.json session keys) are recorded in an
+ append-only journal (SQLite, WAL mode, local scratch) instead of read-modify-write of the JSON file per transition
+-meta-data.json / status.json stay the exported format: pending transitions are applied to the current file content and
+ written atomically (temp file + fsync + os.replace), never truncated; export is serialized across processes by the
+ journal's write lock
+-batch(): transitions inside are exported once at the end (one write per file); outside a batch every transition is
+ exported immediately (previous behaviour)
+-Transitions not exported (crash, NFS error) stay pending and are exported on next flush (store opened at start)
+-Also holds input/output fingerprints of completed stages per (session, stage, trial), see stage_graph
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from time import time
+
+from src.lib.utilities import get_scratch_dir
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS transitions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file TEXT NOT NULL,
+    session TEXT,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    time REAL NOT NULL,
+    exported INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS pending ON transitions (exported, file);
+CREATE TABLE IF NOT EXISTS stage_fingerprints (
+    session TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    trial INTEGER NOT NULL,
+    inputs TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    time REAL NOT NULL,
+    PRIMARY KEY (session, stage, trial)
+);
+'''
+
+
+def write_json_atomic(path: Path, data, indent: int = 4):
+    '''
+    Readers see old or new content, never a partial file
+    '''
+    path = Path(path)
+    tmp_file = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        with open(tmp_file, 'w') as json_file:
+            json.dump(data, json_file, indent=indent)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        os.replace(tmp_file, path)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+
+def get_session_state_file() -> Path:
+    return Path(get_scratch_dir(), 'pipeline_behavior', 'state', 'session_state.db')
+
+
+class SessionStateStore:
+    def __init__(self, db_file: Path = None, debug: bool = False):
+        self.db_file = Path(db_file) if db_file else get_session_state_file()
+        self.debug = debug
+        self.local = threading.local() #ONE CONNECTION PER THREAD
+        self.batch_depth = 0
+        self.batch_lock = threading.Lock()
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=60, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL') #WAL: DURABLE ACROSS PROCESS CRASH, CHEAP COMMITS
+            self.local.conn = conn
+        return conn
+
+    def record(self, json_file: Path, session, key: str, value):
+        '''
+        Appends transition (json_file, session (None: top-level key), key, value); exported now unless in batch()
+        '''
+        self.connection().execute(
+            'INSERT INTO transitions (file, session, key, value, time) VALUES (?, ?, ?, ?, ?)',
+            (str(json_file), session, key, json.dumps(value), time()),
+        )
+        if self.debug:
+            print(f'DEBUG: SessionStateStore::record {json_file} {session} {key}={value}')
+        with self.batch_lock:
+            deferred = self.batch_depth > 0
+        if not deferred:
+            self.flush()
+
+    @contextmanager
+    def batch(self):
+        with self.batch_lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.batch_lock:
+                self.batch_depth -= 1
+                outermost = self.batch_depth == 0
+            if outermost:
+                self.flush()
+
+    def pending(self) -> int:
+        return self.connection().execute('SELECT COUNT(*) FROM transitions WHERE exported = 0').fetchone()[0]
+
+    def flush(self) -> int:
+        '''
+        Exports pending transitions, one atomic write per JSON file; returns number of files written
+        Files that fail (missing, unreadable, NFS error) keep their transitions pending
+        '''
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE') #ONE EXPORTER AT A TIME (ALL PROCESSES)
+        try:
+            rows = conn.execute(
+                'SELECT id, file, session, key, value FROM transitions WHERE exported = 0 ORDER BY id'
+            ).fetchall()
+            by_file = {}
+            for row_id, json_file, session, key, value in rows:
+                by_file.setdefault(json_file, []).append((row_id, session, key, json.loads(value)))
+
+            written = 0
+            for json_file, transitions in by_file.items():
+                try:
+                    with open(json_file, 'r') as state_file:
+                        data = json.load(state_file)
+                    for _, session, key, value in transitions:
+                        if session is None:
+                            data[key] = value
+                        elif session in data:
+                            data[session][key] = value
+                        else:
+                            print(f"Session '{session}' no longer in {json_file}; {key}={value} not exported")
+                    write_json_atomic(json_file, data)
+                except (OSError, ValueError) as e:
+                    print(f'Unable to export session state to {json_file}: {e}')
+                    continue
+                conn.executemany('UPDATE transitions SET exported = 1 WHERE id = ?', [(row_id,) for row_id, *_ in transitions])
+                written += 1
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if self.debug and by_file:
+            print(f'DEBUG: SessionStateStore::flush {len(rows)} transition(s), {written}/{len(by_file)} file(s)')
+        return written
+
+    def get_stage_fingerprints(self, session, stage: str, trial: int):
+        '''
+        (inputs, outputs) fingerprints {path: [size, mtime_ns, digest]} recorded when stage last completed; None if never
+        '''
+        row = self.connection().execute(
+            'SELECT inputs, outputs FROM stage_fingerprints WHERE session = ? AND stage = ? AND trial = ?', (str(session), stage, trial)
+        ).fetchone()
+        return None if row is None else (json.loads(row[0]), json.loads(row[1]))
+
+    def set_stage_fingerprints(self, session, stage: str, trial: int, inputs: dict, outputs: dict):
+        self.connection().execute(
+            'INSERT OR REPLACE INTO stage_fingerprints (session, stage, trial, inputs, outputs, time) VALUES (?, ?, ?, ?, ?, ?)',
+            (str(session), stage, trial, json.dumps(inputs), json.dumps(outputs), time()),
+        )
+
+    def history(self, json_file: Path) -> list[tuple]:
+        '''
+        (time, session, key, value) of all transitions recorded for json_file, oldest first
+        '''
+        rows = self.connection().execute(
+            'SELECT time, session, key, value FROM transitions WHERE file = ? ORDER BY id', (str(json_file),)
+        ).fetchall()
+        return [(t, session, key, json.loads(value)) for t, session, key, value in rows]
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
@@ -0,0 +1,219 @@
+"""
+-Stage graph of a session: every stage declares its inputs and outputs per trial; after a stage completes for a trial,
+ fingerprints of inputs and outputs (size, mtime, optional content digest) are recorded in the session state store
+-On restart only stale (stage, trial) pairs run again: no record, an input or output changed (fingerprint), or an output
+ is missing. Outputs rewritten by a stage change the fingerprints of downstream inputs -> downstream reruns too
+-Digest (blake2b) is only computed if enabled; with a digest, a file whose mtime changed but content did not (copy,
+ touch) is still fresh
+-run_dataflow(): per-trial dataflow instead of stage barriers; trial N enters a stage as soon as the upstream stage
+ finished it, so e.g. splitting trial N overlaps pose estimation of trial N+1 (wall time ~ slowest stage, not sum)
+"""
+
+import os
+import queue
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+
+SESSION_TRIAL = -1 #TRIAL KEY OF STAGES THAT RUN ONCE PER SESSION
+
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path: Path, digest: bool = False):
+    '''
+    [size, mtime_ns, digest (None unless digest and regular file)]; None if path does not exist
+    '''
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    content_digest = file_digest(path) if digest and Path(path).is_file() else None
+    return [stat.st_size, stat.st_mtime_ns, content_digest]
+
+
+def fingerprint_matches(path: Path, recorded) -> bool:
+    current = fingerprint(path)
+    if current is None or recorded is None or current[0] != recorded[0]:
+        return False
+    if current[1] == recorded[1]:
+        return True
+    return recorded[2] is not None and file_digest(path) == recorded[2] #SAME SIZE, NEW mtime: COMPARE CONTENT
+
+
+class TrialsFailed(RuntimeError):
+    '''
+    Raised by Stage.run when only some trials failed (trials); the others completed: their fingerprints are recorded
+    and (dataflow) they are passed downstream. ran: set by run_stage to the stale trials that completed
+    '''
+    def __init__(self, message: str, trials: list[int]):
+        super().__init__(message)
+        self.trials = list(trials)
+        self.ran = []
+
+
+class Stage(NamedTuple):
+    '''
+    inputs/outputs: callable(trial) -> list of paths (trial is SESSION_TRIAL if not per_trial)
+    run: callable(list of stale trials) -> None; runs stage for these trials only (TrialsFailed if some of them failed)
+    after: upstream stage (dataflow); None: trials available at start
+    resource: stages with same resource (e.g. 'gpu') never run concurrently (dataflow)
+    batch: max trials per run call (dataflow); trials waiting when stage becomes free are batched
+    '''
+    name: str
+    inputs: Callable
+    outputs: Callable
+    run: Callable
+    per_trial: bool = True
+    after: str = None
+    resource: str = None
+    batch: int = 1
+
+
+class StageGraph:
+    def __init__(self, session, state_store, file_logger=None, digest: bool = False, debug: bool = False):
+        self.session = str(session) #KEY OF SESSION IN STATE STORE (e.g. SCRATCH FOLDER)
+        self.state_store = state_store
+        self.file_logger = file_logger
+        self.digest = digest
+        self.debug = debug
+
+    def is_fresh(self, stage: str, trial: int, inputs: list, outputs: list) -> bool:
+        if not outputs:
+            return False
+        recorded = self.state_store.get_stage_fingerprints(self.session, stage, trial)
+        if recorded is None:
+            return False
+        recorded_inputs, recorded_outputs = recorded
+        if {str(path) for path in inputs} != set(recorded_inputs) or {str(path) for path in outputs} != set(recorded_outputs):
+            return False
+        return all(fingerprint_matches(path, recorded_inputs[str(path)]) for path in inputs) and \
+            all(fingerprint_matches(path, recorded_outputs[str(path)]) for path in outputs)
+
+    def record(self, stage: str, trial: int, inputs: list, outputs: list) -> bool:
+        '''
+        Records fingerprints after stage completed for trial; False (nothing recorded) if an output is missing
+        '''
+        output_fingerprints = {str(path): fingerprint(path, self.digest) for path in outputs}
+        if not outputs or None in output_fingerprints.values():
+            return False
+        input_fingerprints = {str(path): fingerprint(path, self.digest) for path in inputs}
+        self.state_store.set_stage_fingerprints(self.session, stage, trial, input_fingerprints, output_fingerprints)
+        return True
+
+    def stale_trials(self, stage: Stage, trials: list[int]) -> list[int]:
+        keys = trials if stage.per_trial else [SESSION_TRIAL]
+        return [trial for trial in keys if not self.is_fresh(stage.name, trial, stage.inputs(trial), stage.outputs(trial))]
+
+    def run_stage(self, stage: Stage, trials: list[int], log: bool = True) -> list[int]:
+        '''
+        Runs stage for stale trials only, records fingerprints of completed trials; returns trials that ran
+        TrialsFailed from stage.run (per-trial stages): completed trials are recorded, error re-raised with ran set
+        '''
+        stale = self.stale_trials(stage, trials)
+        error = None
+        if stale:
+            try:
+                stage.run(stale if stage.per_trial else trials)
+            except TrialsFailed as e:
+                if not stage.per_trial: #SESSION OUTPUT INCOMPLETE: NOTHING RECORDED
+                    raise
+                error = e
+                error.ran = [trial for trial in stale if trial not in e.trials]
+            completed = error.ran if error else stale
+            missing = [trial for trial in completed if not self.record(stage.name, trial, stage.inputs(trial), stage.outputs(trial))]
+            if missing:
+                self.log(f"STAGE {stage.name}: output(s) missing for trial(s) {missing}; will run again on restart")
+        if log:
+            total = len(trials if stage.per_trial else [SESSION_TRIAL])
+            self.log_summary(stage, len(stale) - len(error.trials) if error else len(stale), total, len(error.trials) if error else 0)
+        if error:
+            raise error
+        return stale
+
+    def run_dataflow(self, stages: list[Stage], trials: list[int]) -> dict:
+        '''
+        One thread per stage; trials flow stage to stage (per 'after') as soon as each is done. A per-session stage runs
+        once its upstream stage finished all trials. Trials failing in a stage are not passed downstream (other trials of
+        the same batch are, see TrialsFailed); the first error is raised once all stages stopped
+        Returns {stage name: trials that ran}
+        '''
+        done = object() #END OF TRIALS MARKER
+        queues = {stage.name: queue.Queue() for stage in stages}
+        downstream = {stage.name: [other.name for other in stages if other.after == stage.name] for stage in stages}
+        locks = {stage.resource: threading.Lock() for stage in stages if stage.resource}
+        ran = {stage.name: [] for stage in stages}
+        seen = {stage.name: 0 for stage in stages}
+        failed = {stage.name: 0 for stage in stages}
+        errors = []
+
+        def worker(stage: Stage):
+            finished = False
+            while not finished:
+                batch = [queues[stage.name].get()]
+                while len(batch) < (stage.batch if stage.per_trial else len(trials) + 1) and batch[-1] is not done:
+                    try:
+                        batch.append(queues[stage.name].get(block=not stage.per_trial))
+                    except queue.Empty:
+                        break
+                finished = batch[-1] is done
+                batch = [trial for trial in batch if trial is not done]
+                seen[stage.name] += len(batch)
+                if batch:
+                    try:
+                        if stage.resource:
+                            with locks[stage.resource]:
+                                ran[stage.name] += self.run_stage(stage, batch, log=False)
+                        else:
+                            ran[stage.name] += self.run_stage(stage, batch, log=False)
+                    except TrialsFailed as e: #ONLY FAILED TRIALS OF BATCH ARE DROPPED
+                        errors.append(e)
+                        ran[stage.name] += e.ran
+                        failed[stage.name] += len(e.trials)
+                        self.log(f"STAGE {stage.name}: failed for trial(s) {e.trials}: {e}")
+                        batch = [trial for trial in batch if trial not in e.trials]
+                    except Exception as e:
+                        errors.append(e)
+                        failed[stage.name] += len(batch)
+                        self.log(f"STAGE {stage.name}: failed for trial(s) {batch}: {e}")
+                        batch = []
+                for name in downstream[stage.name]:
+                    for trial in batch:
+                        queues[name].put(trial)
+            for name in downstream[stage.name]:
+                queues[name].put(done)
+
+        for stage in stages:
+            if stage.after is None:
+                for trial in trials:
+                    queues[stage.name].put(trial)
+                queues[stage.name].put(done)
+        threads = [threading.Thread(target=worker, args=(stage,), name=f'stage-{stage.name}') for stage in stages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for stage in stages:
+            total = seen[stage.name] if stage.per_trial else int(seen[stage.name] > 0)
+            self.log_summary(stage, len(ran[stage.name]), total, min(failed[stage.name], total))
+        if errors:
+            raise errors[0]
+        return ran
+
+    def log_summary(self, stage: Stage, ran: int, total: int, failed: int = 0):
+        failures = f", failed {failed}" if failed else ""
+        self.log(f"STAGE {stage.name}: ran {ran}, skipped {total - ran - failed} (outputs up to date){failures}")
+
+    def log(self, message: str):
+        if self.file_logger is not None:
+            self.file_logger.logevent(message.ljust(20))
+        elif self.debug:
+            print(f'DEBUG: {message}')
@@ -0,0 +1,95 @@
+"""
+-Lightweight module-level task functions for process pools (ExecutorService)
+-Only arguments and return values are pickled; keep imports here minimal so spawned workers start fast
+"""
+
+import cv2
+from src.lib.frame_decoder import decode_batch
+
+
+def read_image_with_path(image_path: str):
+    '''
+    Read an image from the given path and return it with its path.
+    Expected usage in parallel processing.
+    '''
+    return (image_path, cv2.imread(image_path))
+
+
+def decode_images(image_paths: list[str], backend: str = 'opencv', reduce: int = 1):
+    '''
+    Batched decode (one task per batch: amortizes pickling/IPC cost over several frames)
+    Returns [(image_path, frame)]; see frame_decoder for backends and 'reduce'
+    '''
+    return decode_batch(image_paths, backend, reduce)
+
+
+_trial_manager = None #PER WORKER PROCESS: ViewParsingManager REUSED ACROSS TRIAL TASKS
+
+
+def get_trial_manager(debug: bool = False, **attributes):
+    '''
+    ViewParsingManager of this worker process; small kinematics cache and fresh session indexes per task keep memory
+    per worker bounded (worker processes are long-lived)
+    '''
+    global _trial_manager
+    from src.lib.utilities import FileCache
+    from src.lib.view_parsing_manager import ViewParsingManager
+    if _trial_manager is None:
+        _trial_manager = ViewParsingManager()
+        _trial_manager.kinematics_cache = FileCache(maxsize=2) #SPLIT + FrameData OF SAME TRIAL MAY SHARE ENTRY
+    _trial_manager.debug = debug
+    _trial_manager.session_indexes = {} #PARENT ADDS FILES BETWEEN TASKS: RESCAN
+    for name, value in attributes.items():
+        setattr(_trial_manager, name, value)
+    return _trial_manager
+
+
+def split_trial(data_path: str, trial: int, factor: float, debug: bool = False, manager=None) -> dict:
+    '''
+    Left/right split of one top view trial; manager: run in this process (serial mode), else worker's manager
+    Returns {trial, seconds, outputs, error, parsed (DLC csv parses), kinematics}; errors are returned (summary), not
+    raised. kinematics: TrialKinematics parsed in worker, returned so the parent caches it for FrameData (parsed once)
+    '''
+    import time
+    from pathlib import Path
+    start = time.perf_counter()
+    in_worker = manager is None
+    manager = manager or get_trial_manager(debug)
+    misses = manager.kinematics_cache.misses
+    try:
+        trial_kinematics = manager.load_trial_kinematics(Path(data_path), trial)
+        if trial_kinematics is None:
+            raise FileNotFoundError(f'No filtered DLC csv for trial {trial} in {data_path}')
+        outputs = manager.savemovies_LR(trial_kinematics.filename, trial_kinematics.head_angle, trial_kinematics.df, trial_kinematics.good_frames, factor)
+        return {'trial': trial, 'seconds': time.perf_counter() - start, 'outputs': outputs, 'error': None,
+                'parsed': manager.kinematics_cache.misses - misses, 'kinematics': trial_kinematics if in_worker else None}
+    except Exception as e:
+        return {'trial': trial, 'seconds': time.perf_counter() - start, 'outputs': [], 'error': f'{type(e).__name__}: {e}',
+                'parsed': manager.kinematics_cache.misses - misses, 'kinematics': None}
+
+
+def frame_data_trial(data_path: str, trial: int, xlsx_export: bool = False, debug: bool = False, manager=None, trial_kinematics=None) -> dict:
+    '''
+    FrameData table of one top view trial (+ optional {trial}FrameData.xlsx); manager as in split_trial
+    trial_kinematics: already parsed by split (passed by parent), else loaded here
+    Returns {trial, seconds, outputs, error, parsed, table}
+    '''
+    import os
+    import time
+    from pathlib import Path
+    start = time.perf_counter()
+    manager = manager or get_trial_manager(debug, frame_data_xlsx_export=xlsx_export)
+    misses = manager.kinematics_cache.misses
+    try:
+        if trial_kinematics is None:
+            trial_kinematics = manager.load_trial_kinematics(Path(data_path), trial)
+        if trial_kinematics is None:
+            raise FileNotFoundError(f'No filtered DLC csv for trial {trial} in {data_path}')
+        text = os.path.basename(trial_kinematics.filename)
+        table = manager.writeFrameData(data_path, text, trial_kinematics.good_frames, trial_kinematics.df, trial_kinematics.head_angle)
+        outputs = [os.path.join(data_path, text.split('DLC')[0] + 'FrameData.xlsx')] if manager.frame_data_xlsx_export else []
+        return {'trial': trial, 'seconds': time.perf_counter() - start, 'outputs': outputs, 'error': None,
+                'parsed': manager.kinematics_cache.misses - misses, 'table': table}
+    except Exception as e:
+        return {'trial': trial, 'seconds': time.perf_counter() - start, 'outputs': [], 'error': f'{type(e).__name__}: {e}',
+                'parsed': manager.kinematics_cache.misses - misses, 'table': None}
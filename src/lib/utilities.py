@@ -2,12 +2,71 @@ import os
 import shutil
 from pathlib import Path
 from datetime import datetime
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
 import concurrent
 from concurrent.futures.process import ProcessPoolExecutor
 from concurrent.futures import Future, ThreadPoolExecutor
 import subprocess
 
 
+class FileCache:
+    '''
+    LRU cache of values derived from files (e.g. parsed DLC csv + kinematics), keyed by (path, mtime, size):
+    a rewritten file is parsed again, older versions of it are dropped
+    '''
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, filename, loader):
+        '''
+        Cached loader(filename) for current version of file
+        '''
+        stat = os.stat(filename)
+        key = (str(filename), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        value = loader(filename)
+        self._store(key, value)
+        return value
+
+    def peek(self, filename):
+        '''
+        Cached value for current version of file; None if not cached (never loads)
+        '''
+        stat = os.stat(filename)
+        with self.lock:
+            return self.entries.get((str(filename), stat.st_mtime_ns, stat.st_size))
+
+    def put(self, filename, value):
+        '''
+        Stores value loaded elsewhere (e.g. in worker process) for current version of file
+        '''
+        stat = os.stat(filename)
+        self._store((str(filename), stat.st_mtime_ns, stat.st_size), value)
+
+    def _store(self, key, value):
+        with self.lock:
+            for stale in [entry for entry in self.entries if entry[0] == key[0]]:
+                del self.entries[stale]
+            self.entries[key] = value
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
 def get_scratch_dir():
     """
     Helper method to return the scratch dir
@@ -31,6 +90,24 @@ def get_nworkers():
     return cpu_cores
 
 
+def get_available_memory_mb():
+    '''
+    Available memory on compute host (MB): MemAvailable of /proc/meminfo (free + reclaimable page cache; movie creation
+    fills page cache with GBs of video), else free pages (SC_AVPHYS_PAGES); None if not reported by OS
+    '''
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024 #kB
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1 << 20)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
 def run_commands_concurrently(function, compute_keys, workers):
     """This method uses the ProcessPoolExecutor library to run
     multiple processes at the same time. It also has a debug option.
@@ -50,6 +127,30 @@ def run_commands_concurrently(function, compute_keys, workers):
             executor.shutdown(wait=True)
 
 
+def imap_bounded(executor, function, items, buffer_size: int):
+    '''
+    Ordered, memory-bounded alternative to executor.map
+
+    executor.map submits every item up front and keeps all results until they are consumed; here at most
+    buffer_size tasks are in flight (queued, running or finished but not yet consumed) at any time.
+    Results are yielded in submission order as soon as they are ready.
+
+    N.B. First buffer_size items are submitted on call (not on first iteration) so that a fork-based pool
+    starts its workers before the caller opens any pipes (e.g. ffmpeg stdin) that children would otherwise inherit
+    '''
+    items = iter(items)
+    pending = deque(executor.submit(function, item) for item in islice(items, max(1, buffer_size)))
+
+    def results():
+        while pending:
+            result = pending.popleft().result()
+            for item in islice(items, 1): #KEEP BUFFER FULL BEFORE HANDING RESULT DOWNSTREAM
+                pending.append(executor.submit(function, item))
+            yield result
+
+    return results()
+
+
 def delete_in_background(path: str) -> Future:
     current_date = datetime.now().strftime('%Y-%m-%d')
     old_path = f"{path}.old_{current_date}"
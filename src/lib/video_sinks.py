@@ -0,0 +1,151 @@
+"""
+-Single-decode, multi-encode fan-out of frames to video outputs (sinks)
+-Each sink owns its encoder (ffmpeg subprocess fed via stdin pipe) and a writer thread
+"""
+
+import threading
+from queue import Queue
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+
+CODECS = {
+    'avi': 'rawvideo',
+    'avi_ffv1': 'ffv1', #LOSSLESS; DECODED FRAMES IDENTICAL TO 'avi'
+    'avi_utvideo': 'utvideo', #LOSSLESS, FASTER ENCODE/DECODE THAN ffv1, LARGER FILES
+    'mp4': 'libx264',
+}
+
+FFMPEG_PARAMS = {
+    'avi_ffv1': ['-level', '3', '-g', '1', '-slices', '16'], #INTRA-ONLY, SLICE THREADING
+}
+
+#rawvideo AVI STORES FRAMES AS PASSED (BGR FROM DECODERS) AND cv2 READS THEM BACK UNCHANGED; LOSSLESS CODECS CONVERT
+#rgb24 INPUT PROPERLY -> CHANNELS REVERSED ON INPUT SO ALL AVI FORMATS DECODE TO THE SAME FRAMES
+REVERSE_CHANNELS = {'avi_ffv1', 'avi_utvideo'}
+
+
+def reverse_channels(frame):
+    return frame[:, :, ::-1]
+
+
+def get_codec(format_type: str) -> str:
+    '''
+    Codec (ffmpeg/moviepy name) based on format type
+    '''
+    if format_type not in CODECS:
+        raise ValueError(f"Unsupported format type: {format_type}")
+    return CODECS[format_type]
+
+
+class FFmpegSink:
+    '''
+    Encodes frames to single output file through ffmpeg (same writer moviepy uses for write_videofile)
+
+    Optional 'transform' is applied to each frame before encoding (e.g. downscale for preview outputs);
+    'size' must then be the size of the transformed frame
+    '''
+
+    def __init__(self, output_filename: str, format_type: str, fps: int, size: tuple[int, int], transform=None, ffmpeg_params=None):
+        self.output_filename = str(output_filename)
+        self.transform = transform
+        self.reverse_channels = format_type in REVERSE_CHANNELS
+        if ffmpeg_params is None:
+            ffmpeg_params = FFMPEG_PARAMS.get(format_type)
+        self.writer = FFMPEG_VideoWriter(self.output_filename, size, fps, codec=get_codec(format_type), ffmpeg_params=ffmpeg_params)
+
+    def write(self, frame):
+        if self.transform is not None:
+            frame = self.transform(frame)
+        if self.reverse_channels:
+            frame = reverse_channels(frame)
+        self.writer.write_frame(frame)
+
+    def close(self):
+        self.writer.close()
+
+
+def make_sink(output_filename: str, format_type: str, fps: int, size: tuple[int, int]):
+    '''
+    Sink for format: 'frames' -> raw frame store (frame_source.FrameStoreWriter, no encoder), else FFmpegSink
+    '''
+    if format_type == 'frames':
+        from src.lib.frame_source import FrameStoreWriter
+        return FrameStoreWriter(output_filename, size)
+    return FFmpegSink(output_filename, format_type, fps, size)
+
+
+class FanOutWriter:
+    '''
+    Frames are decoded once and handed (by reference; no copy, no pickling) to N sinks.
+    Every sink runs in own thread with bounded queue: slow encoder (libx264) does not stall fast one (rawvideo)
+    until its queue is full. Pipe writes release the GIL so sinks encode concurrently.
+
+    Frames passed to write() must not be modified afterwards (shared between sinks).
+    Peak memory: queue_size frames per sink (at most)
+    Sinks with abort() (frame store) are aborted instead of closed if their write failed or the producer raised
+    (with block): no incomplete output under the final name
+    '''
+
+    def __init__(self, sinks: list, queue_size: int = 16):
+        self.sinks = sinks
+        self.queues = [Queue(maxsize=max(1, queue_size)) for _ in sinks]
+        self.errors = []
+        self.aborted = False
+        self.threads = [
+            threading.Thread(target=self._drain, args=(sink, queue), daemon=True)
+            for sink, queue in zip(self.sinks, self.queues)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _drain(self, sink, queue: Queue):
+        failed = False
+        while True:
+            frame = queue.get()
+            if frame is None:
+                break
+            if failed:
+                continue #KEEP CONSUMING SO PRODUCER NEVER BLOCKS ON FAILED SINK
+            try:
+                sink.write(frame)
+            except Exception as e:
+                failed = True
+                self.errors.append((sink, e))
+        try:
+            if (failed or self.aborted) and hasattr(sink, 'abort'):
+                sink.abort()
+            else:
+                sink.close()
+        except Exception as e:
+            self.errors.append((sink, e))
+
+    def write(self, frame):
+        for queue in self.queues:
+            queue.put(frame)
+
+    def write_all(self, frames) -> int:
+        '''
+        Write every frame from iterable; returns frame count
+        '''
+        frame_cnt = 0
+        for frame in frames:
+            self.write(frame)
+            frame_cnt += 1
+        return frame_cnt
+
+    def close(self):
+        for queue in self.queues:
+            queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            sink, e = self.errors[0]
+            raise RuntimeError(f"Video encoding failed for {getattr(sink, 'output_filename', sink)}: {e}") from e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.aborted = True #SET BEFORE END MARKERS ARE QUEUED (SEEN BY ALL WRITER THREADS)
+        self.close()
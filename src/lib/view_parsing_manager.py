@@ -1,22 +1,42 @@
+from __future__ import annotations
 import os
 from pathlib import Path
-import time
-import pandas as pd
-import deeplabcut
+from typing import NamedTuple, TYPE_CHECKING
 import re
-import numpy as np
 import math
-import cv2 
-from PIL import Image, ImageEnhance
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
 
-
-from src.lib import image_util
-from src.lib.utilities import get_scratch_dir, move_files_in_background
+#HEAVY MODULES (pandas, numpy, cv2, openpyxl, pose backend) ARE IMPORTED BY THE METHODS THAT USE THEM;
+#KEEPS START-UP OF run_post_acquisition.py FAST FOR TASKS THAT NEVER PARSE VIEWS (E.G. movie_creation)
+from src.lib.utilities import get_scratch_dir, move_files_in_background, FileCache
+from src.lib.session_index import SessionIndex
+from src.lib.stage_graph import Stage, StageGraph, TrialsFailed
 from settings import dlc_setting as dlc_config
 #import settings.dlc_setting as dlc_config
 
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from src.lib import kinematics
+
+
+class SplitRegion(NamedTuple):
+    '''
+    Output window of top view split: columns [start_index, end_index) of 700x770 crop around nose, shifted by faceshift
+    Output file: {prefix}{trial}{suffix}.avi
+    '''
+    prefix: str
+    suffix: str
+    start_index: int
+    end_index: int
+    faceshift: int = 60
+    flip: bool = False
+
+
+TOP_VIEW_SPLIT_REGIONS = [
+    SplitRegion('Mirror', 'R', 315, 630, faceshift=60, flip=True),
+    SplitRegion('Mask', 'L', 0, 315, faceshift=80),
+]
+
 
 class ViewParsingManager:
     def __init__(self):
@@ -29,6 +49,9 @@ class ViewParsingManager:
         self.side_view_config_file = dlc_config.side_view_config_file
         self.eye_config_file = dlc_config.eye_config_file
 
+        self.kinematics_cache = FileCache(maxsize=64) # parsed DLC csv + kinematics per trial; cleared per session
+        self.session_indexes = {} # {session folder: SessionIndex}; one scandir per session, updated by stages
+
 
     def process_top_view_videos(self, metadata_status: dict):
         '''
@@ -44,6 +67,10 @@ class ViewParsingManager:
 
         if self.use_scratch:
             scratch_tmp = get_scratch_dir()
+
+        #'split' POOL ONLY FOR TOP VIEW RUNS (NOT movie_creation / side): STARTED HERE, BEFORE STAGES OPEN PIPES OR THREADS
+        if self.trial_workers == 'process' and metadata_status:
+            self.executor_service.start('split')
         
         for folder, subfolders in metadata_status.items():
             self.fileLogger.logevent(f"Posture extraction from top view {folder} - {subfolders}.".ljust(20))
@@ -54,55 +81,61 @@ class ViewParsingManager:
                 final_output = Path(self.base_output_location, folder, session)
                 meta_data_filename = Path(final_output, "meta-data.json")
                 SCRATCH = Path(scratch_tmp, 'pipeline_behavior', folder, session, 'img_recordings')
+                self.kinematics_cache.clear() #PER-SESSION CACHE
+                session_index = self.open_session_index(SCRATCH) #FRESH SCAN: MOVIES CREATED BY EARLIER STAGE
 
                 # GET ALL .avi FILES MATCHING {number}.avi
-                top_movie_files = [
-                    file for file in SCRATCH.glob("*.avi") 
-                    if re.match(r'^\d+\.avi$', file.name)
-                ]
+                top_movie_files = session_index.files_with_role('top_video')
                 #SECONDARY STORAGE LOCATION (IF ALREADY MOVED)
                 top_movie_files_final = [
                     file for file in final_output.glob("*.avi") 
                     if re.match(r'^\d+\.avi$', file.name)
                 ]
-                if len(top_movie_files) > 0 and len(top_movie_files) == files_cnt:
-                    print(f'.avi FILE COUNT MATCHES EXPECTED COUNT')
-                    
-                    self.analyze_all_videos(top_movie_files, top_view_config, shuffle=dlc_config.top_shuffle)
-                    self.fileLogger.update_individual_json_manifest(meta_data_filename, 'analyze_movies')
-                    
-                    self.split_left_and_right_from_top_video(SCRATCH)
-                    self.fileLogger.update_individual_json_manifest(meta_data_filename, 'split_top_left_right')
-
-                    self.analyze_left_video(SCRATCH)
-                    self.fileLogger.update_individual_json_manifest(meta_data_filename, 'analyze_left_video')
-
-                    self.analyze_right_video(SCRATCH)
-                    self.fileLogger.update_individual_json_manifest(meta_data_filename, 'analyze_right_video')
-
-                    self.writeFrameData_from_top_video(SCRATCH)
-                    self.fileLogger.update_individual_json_manifest(meta_data_filename, 'writeFrameData_from_top_video')
-
-                    if self.debug:
-                        print(f'MOVING ANALYSIS FILES FROM {SCRATCH} TO {final_output}')
-                    move_files_in_background('.avi', SCRATCH, final_output, self.debug)
-                    move_files_in_background('.mp4', SCRATCH, final_output, self.debug)
-                    move_files_in_background('.csv', SCRATCH, final_output, self.debug)
-                    move_files_in_background('.pickle', SCRATCH, final_output, self.debug)
-                    move_files_in_background('.h5', SCRATCH, final_output, self.debug)
-                    status = (session, 'processed', True)
-
-                else:
-                    print(f'INCORRECT .avi FILE COUNT: EXPECTED={len(top_movie_files)} ACTUAL={files_cnt}')
-                    print(f'MOVIE FILE COUNT ON STORAGE ({SCRATCH}): {len(top_movie_files)}, meta-data FOLDER COUNT: {files_cnt}')
-                    print(f'TRYING final_output ON SERVER: {final_output}')
-
-                    print(f'SKIPPING {folder}, {session}')
+                #STAGE TRANSITIONS OF SESSION EXPORTED TO meta-data.json/status.json ONCE (ATOMIC) AT END OF SESSION
+                with self.fileLogger.session_state.batch():
+                    if len(top_movie_files) > 0 and len(top_movie_files) == files_cnt:
+                        print(f'.avi FILE COUNT MATCHES EXPECTED COUNT')
+
+                        #EACH STAGE RUNS ONLY FOR TRIALS WITH MISSING/STALE OUTPUTS (RESUME AFTER CRASH, see stage_graph)
+                        stage_graph = StageGraph(SCRATCH, self.fileLogger.session_state, self.fileLogger, self.stage_fingerprint_digest, self.debug)
+                        trials = session_index.trials('top_video')
+                        top_view_stages = self.top_view_stages(SCRATCH, top_view_config)
+                        if self.top_view_dataflow:
+                            #PER-TRIAL DATAFLOW: SPLIT/FrameData OF FINISHED TRIALS OVERLAP POSE ESTIMATION OF LATER TRIALS
+                            stage_graph.run_dataflow(top_view_stages, trials)
+                            for stage in top_view_stages:
+                                self.fileLogger.update_individual_json_manifest(meta_data_filename, stage.name)
+                        else:
+                            for stage in top_view_stages:
+                                stage_graph.run_stage(stage, trials)
+                                self.fileLogger.update_individual_json_manifest(meta_data_filename, stage.name)
+
+                        if self.debug:
+                            print(f'MOVING ANALYSIS FILES FROM {SCRATCH} TO {final_output}')
+                        move_files_in_background('.avi', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+                        move_files_in_background('.mp4', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+                        move_files_in_background('.csv', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+                        move_files_in_background('.pickle', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+                        move_files_in_background('.h5', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+                        move_files_in_background('FrameData.*', SCRATCH, final_output, self.move_or_copy_to_final_output, self.debug)
+                        status = (session, 'processed', True)
+
+                    else:
+                        print(f'INCORRECT .avi FILE COUNT: EXPECTED={len(top_movie_files)} ACTUAL={files_cnt}')
+                        print(f'MOVIE FILE COUNT ON STORAGE ({SCRATCH}): {len(top_movie_files)}, meta-data FOLDER COUNT: {files_cnt}')
+                        print(f'TRYING final_output ON SERVER: {final_output}')
+
+                        print(f'SKIPPING {folder}, {session}')
+
+                    #RAW FRAME STORES ARE SCRATCH-ONLY, NOT MOVED: REMOVED WHETHER SESSION WAS PROCESSED OR SKIPPED
+                    from src.lib.frame_source import remove_frame_stores
+                    for frame_store in remove_frame_stores(SCRATCH):
+                        session_index.remove(frame_store)
                 
-                if status[1] == 'processed':
-                    self.fileLogger.update_metadata_status_file(Path(self.base_input_location, folder), status)
-                else:
-                    print('NO UPDATES TO status.json')
+                    if status[1] == 'processed':
+                        self.fileLogger.update_metadata_status_file(Path(self.base_input_location, folder), status)
+                    else:
+                        print('NO UPDATES TO status.json')
 
         if self.debug:
             print('Finished all top view steps.')
@@ -139,240 +172,383 @@ class ViewParsingManager:
         # analyze_eye_video(data_path)
 
 
+    def top_view_stages(self, data_path: Path, top_view_config: Path) -> list[Stage]:
+        '''
+        Top view chain with per-trial inputs/outputs (from session index); stage names are the meta-data.json last_task values
+        Dataflow: pose stages share the 'gpu' resource and take up to dataflow_pose_batch trials per call (model loaded
+        once per call); split -> whisker pose per trial; FrameData once top view pose of all trials is done
+        Split takes up to one trial per 'split' pool worker per call (trial_workers 'process')
+        '''
+        index = self.get_session_index(data_path)
+        executor_service = getattr(self, 'executor_service', None)
+        split_batch = executor_service.stage_budget.get('split', 1) if self.trial_workers == 'process' and executor_service is not None else 1
+
+        def view_pose_files(prefix):
+            return lambda trial: [file for file in index.trial_files('view_dlc_csv', trial) if file.name.startswith(prefix)]
+
+        def analyze_top_view(trials):
+            self.clear_pose_outputs(data_path, trials)
+            self.analyze_all_videos([file for trial in trials for file in index.trial_files('top_video', trial)], top_view_config, shuffle=dlc_config.top_shuffle)
+
+        def analyze_view(prefix, analyze):
+            def run(trials):
+                self.clear_pose_outputs(data_path, trials, prefix)
+                analyze(data_path, trials=trials)
+            return run
+
+        return [
+            Stage('analyze_movies',
+                  lambda trial: index.trial_files('top_video', trial),
+                  lambda trial: index.trial_files('dlc_filtered_csv', trial),
+                  analyze_top_view,
+                  resource='gpu', batch=self.dataflow_pose_batch),
+            Stage('split_top_left_right',
+                  lambda trial: index.trial_files('top_video', trial) + index.trial_files('dlc_filtered_csv', trial),
+                  lambda trial: index.trial_files('mask_video', trial) + index.trial_files('mirror_video', trial),
+                  lambda trials: self.split_left_and_right_from_top_video(data_path, trials),
+                  after='analyze_movies', batch=split_batch),
+            Stage('analyze_left_video',
+                  lambda trial: index.trial_files('mask_video', trial),
+                  view_pose_files('Mask'),
+                  analyze_view('Mask', self.analyze_left_video),
+                  after='split_top_left_right', resource='gpu', batch=self.dataflow_pose_batch),
+            Stage('analyze_right_video',
+                  lambda trial: index.trial_files('mirror_video', trial),
+                  view_pose_files('Mirror'),
+                  analyze_view('Mirror', self.analyze_right_video),
+                  after='split_top_left_right', resource='gpu', batch=self.dataflow_pose_batch),
+            Stage('writeFrameData_from_top_video',
+                  lambda trial: index.files_with_role('dlc_filtered_csv'),
+                  lambda trial: [file for file in index.files_with_role('frame_data') if file.name.startswith('FrameData')],
+                  lambda trials: self.writeFrameData_from_top_video(data_path),
+                  per_trial=False, after='analyze_movies'),
+        ]
+
+
+    def clear_pose_outputs(self, data_path: Path, trials: list[int], prefix: str = ''):
+        '''
+        Removes pose outputs (csv, h5, pickle) of trials before re-analysis; DeepLabCut skips videos that already have outputs
+        prefix: '' top view ({trial}DLC...), 'Mask' / 'Mirror' whisker views
+        '''
+        index = self.get_session_index(data_path)
+        for trial in trials:
+            for role in ['dlc_filtered_csv', 'dlc_csv', 'view_dlc_csv', 'h5', 'pickle']:
+                for file in index.trial_files(role, trial):
+                    if file.name.startswith(prefix) and (prefix or file.name[0].isdigit()):
+                        file.unlink(missing_ok=True)
+                        index.remove(file)
+
+
     def analyze_all_videos(self, video_files, training_model, shuffle: int = 3):
         ''' prev. analyze_videos(videos,config_type,shuffle=3)
-            EXPECTED OUTPUT {FROM DEEPLABCUT}: filtered csv file per session
+            EXPECTED OUTPUT {FROM DEEPLABCUT}: {trial}DLC_{scorer}.h5/.csv + filtered csv file per video (layout unchanged)
+            dlc_inference_mode 'session': model/graph built once for all trial videos of session (single analyze_videos call),
+            frames pushed through network in batches of dlc_batch_size; 'trial': model reloaded per video (previous behaviour)
+            Runs on CPU when no GPU is visible
         '''
 
         if self.debug:
             print(f'DEBUG: ViewParsingManager::analyze_all_videos')
+        from src.lib.pose_backend import get_pose_backend
+
+        video_files = [str(individual_video_file) for individual_video_file in video_files]
+        if not video_files:
+            return
+
+        self.fileLogger.logevent(f"analyze_all_videos: MODEL:{training_model}, {shuffle=}, {len(video_files)} video(s), backend={self.pose_backend}, mode={self.dlc_inference_mode}, batchsize={self.dlc_batch_size}.".ljust(20))
 
-        self.fileLogger.logevent(f"analyze_all_videos: MODEL:{training_model}, {shuffle=}.".ljust(20))
+        if self.dlc_inference_mode == 'session':
+            video_groups = [video_files]
+        else:
+            video_groups = [[individual_video_file] for individual_video_file in video_files]
 
-        for individual_video_file in video_files:
+        pose_backend = get_pose_backend(self.pose_backend)
+        for videos in video_groups:
             if self.debug:
-                print(f'DEBUG: Analyzing individual video file & filtering predictions: {individual_video_file}')
-            deeplabcut.analyze_videos(training_model, [str(individual_video_file)], shuffle=shuffle, save_as_csv=True)
-            deeplabcut.filterpredictions(training_model, [str(individual_video_file)], shuffle=shuffle, save_as_csv=True)
+                print(f'DEBUG: Analyzing video file(s) & filtering predictions ({pose_backend.name}): {videos}')
+            pose_backend.analyze(training_model, videos, shuffle=shuffle, batch_size=self.dlc_batch_size)
+
+        #POSE OUTPUT NAMES DEPEND ON MODEL (SCORER) -> RESCAN INDEXED FOLDERS THAT RECEIVED OUTPUTS
+        for data_path in {Path(individual_video_file).parent for individual_video_file in video_files}:
+            if data_path in self.session_indexes:
+                self.session_indexes[data_path].rescan()
+
+
+    def open_session_index(self, data_path: Path) -> SessionIndex:
+        '''
+        New index of session folder (single os.scandir), replaces any previous one
+        '''
+        self.session_indexes[Path(data_path)] = SessionIndex(data_path)
+        return self.session_indexes[Path(data_path)]
 
 
-    def analyze_left_video(self, data_path, shuffle: int = dlc_config.left_shuffle):
-        left_videos = [os.path.join(data_path,f) for f in os.listdir(data_path) if f.startswith('Mask')  and  f.endswith('.avi')  ] 
+    def get_session_index(self, data_path: Path) -> SessionIndex:
+        if Path(data_path) not in self.session_indexes:
+            return self.open_session_index(data_path)
+        return self.session_indexes[Path(data_path)]
+
+
+    def analyze_left_video(self, data_path, shuffle: int = dlc_config.left_shuffle, trials: list[int] = None):
+        left_videos = self.get_session_index(data_path).files_with_role('mask_video')
+        if trials is not None:
+            left_videos = [video for video in left_videos if SessionIndex.trial_of(video) in trials]
         self.analyze_all_videos(left_videos, dlc_config.whisker_config_file, shuffle)
 
 
-    def analyze_right_video(self, data_path, shuffle: int = dlc_config.right_shuffle):
-        right_videos = [os.path.join(data_path,f) for f in os.listdir(data_path) if f.startswith('Mirror') and  f.endswith('.avi')  ] 
+    def analyze_right_video(self, data_path, shuffle: int = dlc_config.right_shuffle, trials: list[int] = None):
+        right_videos = self.get_session_index(data_path).files_with_role('mirror_video')
+        if trials is not None:
+            right_videos = [video for video in right_videos if SessionIndex.trial_of(video) in trials]
         self.analyze_all_videos(right_videos, dlc_config.whisker_config_file, shuffle)
 
 
-    def split_left_and_right_from_top_video(self, data_path: Path):
-        ''' prev. split_left_and_right_from_top_video(data_path)'''
+    def split_left_and_right_from_top_video(self, data_path: Path, trials: list[int] = None) -> list[dict]:
+        ''' prev. split_left_and_right_from_top_video(data_path)
+            trials: subset of trials to split (default: all top view videos of session)
+            Trials sharded over 'split' process pool (trial_workers); returns per-trial summary (see run_trial_tasks)
+        '''
 
         if self.debug:
             print(f'DEBUG: ViewParsingManager::split_left_and_right_from_top_video')
+        from src.lib.tasks import split_trial
 
-        #not really text files (top) - rename
-        text_files = [os.path.join(data_path,f) for f in os.listdir(data_path) if f.endswith('.avi') and not f.endswith('L.avi') and not f.endswith('R.avi') and not f.endswith('videopoints.avi') and not f.endswith('videopoints.avi')]
+        trials = trials if trials is not None else self.get_session_index(data_path).trials('top_video')
+        return self.run_trial_tasks('split_top_left_right', split_trial, data_path, trials, factor=self.contrastfactor)
 
-        for trial in range(len(text_files)):
-            t = time.time()
-            df, head_angle, interbead_distance, movie_name = self.readDLCfiles(data_path, trial)
-            text = os.path.basename(movie_name)
-            good_frames = self.find_good_frames(0.7, 5, 200, df, interbead_distance)
-            
-            self.savemovies_LR(movie_name, head_angle, df, good_frames, self.contrastfactor) 
-            elapsed = time.time() - t 
-            video_name = (os.path.join(os.path.dirname(movie_name),text.split('DLC')[0]+".avi"));
-            
-            print('Trial=', video_name, 'Elapsed', elapsed)
+
+    def run_trial_tasks(self, stage: str, task, data_path: Path, trials: list[int], trial_kwargs: dict = None, **kwargs) -> list[dict]:
+        '''
+        Runs task (src/lib/tasks.py) per trial: trial_workers 'process' -> 'split' process pool (one task per trial, results
+        in trial order), 'serial' -> this process. Outputs of tasks are added to session index, kinematics parsed in
+        workers to kinematics_cache; per-trial timing and errors logged as one summary; raises TrialsFailed once all
+        trials ran if any failed
+        trial_kwargs: {trial: extra task arguments of that trial}
+        '''
+        trial_kwargs = trial_kwargs or {}
+        executor_service = getattr(self, 'executor_service', None)
+        if self.trial_workers == 'process' and executor_service is not None and len(trials) > 1:
+            executor = executor_service.process_pool('split')
+            workers = executor_service.stage_budget.get('split', 1)
+            futures = [executor.submit(task, str(data_path), trial, debug=self.debug, **kwargs, **trial_kwargs.get(trial, {})) for trial in trials]
+            results = [future.result() for future in futures]
+        else:
+            workers = 1
+            results = [task(str(data_path), trial, debug=self.debug, manager=self, **kwargs, **trial_kwargs.get(trial, {})) for trial in trials]
+
+        session_index = self.get_session_index(data_path)
+        for result in results:
+            for output_name in result['outputs']:
+                session_index.add(output_name)
+            trial_kinematics = result.pop('kinematics', None)
+            if trial_kinematics is not None: #PARSED IN WORKER: SHARED WITH LATER STAGES (FrameData) OF TRIAL
+                self.kinematics_cache.put(trial_kinematics.filename, trial_kinematics)
+        self.log_trial_summary(stage, results, workers)
+
+        failed = [result for result in results if result['error']]
+        if failed:
+            raise TrialsFailed(f"{stage}: {len(failed)} of {len(results)} trial(s) failed: " + '; '.join(f"trial {result['trial']}: {result['error']}" for result in failed),
+                               [result['trial'] for result in failed])
+        return results
+
+
+    def log_trial_summary(self, stage: str, results: list[dict], workers: int):
+        if not results:
+            return
+        slowest = max(results, key=lambda result: result['seconds'])
+        failed = [result for result in results if result['error']]
+        self.fileLogger.logevent(
+            f"{stage}: {len(results)} trial(s), {workers} worker(s), {sum(result['seconds'] for result in results):.1f} s total, "
+            f"slowest trial {slowest['trial']} ({slowest['seconds']:.1f} s), DLC csv parsed {sum(result.get('parsed', 0) for result in results)}, "
+        f"failed {len(failed)}".ljust(20))
+        for result in failed:
+            self.fileLogger.logevent(f"{stage}: trial {result['trial']} failed after {result['seconds']:.1f} s: {result['error']}".ljust(20))
+        if self.debug:
+            for result in results:
+                print(f"DEBUG: {stage} trial {result['trial']}: {result['seconds']:.2f} s")
 
 
     def readDLCfiles(self, data_path: Path, trial: int):  
-        smoothingwin = 5
-        Xfiles = [
-            os.path.join(data_path, i)
-            for i in os.listdir(data_path)
-            if (match := re.match(r'(\d+)videoDLC.*filtered\.csv', i)) and int(match.group(1)) == trial
-        ]
-        trial_num_len = len(str(trial)) 
-        print(data_path)
-        Xfiles = [
-            os.path.join(data_path, i)
-            for i in os.listdir(data_path)
-            if i[:trial_num_len] == str(trial)
-            and re.match(r'\d+DLC', i)
-            and 'filtered.csv' in i
-            and i[trial_num_len].isalpha()
-        ]
+        trial_kinematics = self.load_trial_kinematics(data_path, trial)
+        if trial_kinematics is None:
+            return None, None, None, None
+        return trial_kinematics.df, trial_kinematics.head_angle, trial_kinematics.inter_bead_distance, trial_kinematics.filename
+
+
+    def load_trial_kinematics(self, data_path: Path, trial: int) -> kinematics.TrialKinematics | None:
+        '''
+        DLC filtered csv of trial parsed once: df, head angle, inter-bead distance, good frames (0.7, 5, 200)
+        Cached in kinematics_cache keyed by csv (path, mtime, size); split and FrameData stages share entries
+        '''
+        filename = self.find_dlc_file(data_path, trial)
+        if filename is None:
+            return None
+        return self.kinematics_cache.get(filename, self.parse_dlc_file)
+
+
+    def cached_trial_kinematics(self, data_path: Path, trial: int) -> kinematics.TrialKinematics | None:
+        '''
+        Kinematics of trial if already in kinematics_cache (current csv version); never parses
+        '''
+        filename = self.find_dlc_file(data_path, trial)
+        return None if filename is None else self.kinematics_cache.peek(filename)
+
+
+    def find_dlc_file(self, data_path: Path, trial: int) -> str | None:
+        '''
+        Filtered top view DLC csv ({trial}DLC*filtered.csv) from session index
+        '''
+        if self.debug:
+            print(f'DEBUG: ViewParsingManager::find_dlc_file - {data_path} trial {trial}')
+        Xfiles = self.get_session_index(data_path).trial_files('dlc_filtered_csv', trial)
         
         if len(Xfiles) != 1:
             print(f'ERROR: Expected at least one filtered.csv file in {data_path}')
-            return None, None, None, None
-        
-        filename = Xfiles[0]
+            return None
+        return str(Xfiles[0])
+
+
+    def parse_dlc_file(self, filename: str) -> kinematics.TrialKinematics:
+        import pandas as pd
+        from src.lib import kinematics
+        smoothingwin = 5
+        if self.debug:
+            print(f'DEBUG: ViewParsingManager::parse_dlc_file - {filename}')
         
         df = pd.read_csv(filename, header=2, usecols = ['x','y', 'likelihood', 'x.1', 'y.1', 'likelihood.1'])
         df.columns = ['Nosex', 'Nosey', 'Noselikelihood', 'Snoutx1', 'Snouty1', 'Snoutlikelihood']
         
-        x1 = self.smooth_data_convolve_my_average(df.Nosex, smoothingwin)
-        y1 = self.smooth_data_convolve_my_average(df.Nosey, smoothingwin)
-        x2 = self.smooth_data_convolve_my_average(df.Snoutx1, smoothingwin)
-        y2 = self.smooth_data_convolve_my_average(df.Snouty1, smoothingwin)
-        head_angles = [math.atan2(-(y1[i]-y2[i]),-(x1[i]-x2[i]))  for i in range(len(df.Snoutlikelihood))] # define the angle of the head
-        inter_bead_distance = [math.sqrt((x2[i] - x1[i])**2 + (y2[i] - y1[i])**2)  for i in range(len(df.Snoutlikelihood))]# define the distance between beads  
+        head_angles, inter_bead_distance = kinematics.compute_kinematics(df, smoothingwin) # angle of the head, distance between beads
         head_angles = pd.Series(head_angles)
+        good_frames = self.find_good_frames(0.7, 5, 200, df, inter_bead_distance)
 
-        return df, head_angles, inter_bead_distance, filename
+        return kinematics.TrialKinematics(df, head_angles, inter_bead_distance, filename, good_frames)
         
 
     def smooth_data_convolve_my_average(self, arr, span):
-        re = np.convolve(arr, np.ones(span * 2 + 1) / (span * 2 + 1), mode="same")
-        re[0] = np.average(arr[:span])
-        for i in range(1, span + 1):
-            re[i] = np.average(arr[:i + span])
-            re[-i] = np.average(arr[-i - span:])
-        return re
+        from src.lib import kinematics
+        return kinematics.smooth_data_convolve_my_average(arr, span)
     
 
-    def find_good_frames(self, Minliklihood, mindist, maxdist, df, Distance):
-        Good_Frames = [0 if df.Noselikelihood[i] <Minliklihood or df.Snoutlikelihood[i] <Minliklihood or Distance[i]<mindist or Distance[i]>maxdist else 1 for i in range(len(df.Snoutlikelihood))]
-        a=pd.Series(Good_Frames)
-        a[a==0] = np.nan
-        return a
+    def find_good_frames(self, Minliklihood, mindist, maxdist, df, Distance) -> kinematics.GoodFrames:
+        '''
+        Good frames: both beads tracked with Minliklihood and inter-bead distance within [mindist, maxdist]
+        Returns boolean mask per frame + index array of good frames
+        '''
+        from src.lib import kinematics
+        return kinematics.find_good_frames(df.Noselikelihood, df.Snoutlikelihood, Distance, Minliklihood, mindist, maxdist)
     
 
-    def savemovies_LR(self, movie_name: str, head_angle, df, good_frames, factor): 
+    def savemovies_LR(self, movie_name: str, head_angle, df, good_frames, factor, regions=None, frame_source=None): 
+        '''
+        Writes Mirror{trial}R.avi and Mask{trial}L.avi (+ any additional regions) next to top view video {trial}.avi
+        frame_source: frames read from (default: raw frame store {trial}.frames if present, else top view video {trial}.avi;
+        e.g. JPEG trial folder, see frame_source)
+        '''
         if self.debug:
             print(f'DEBUG: ViewParsingManager::savemovies_LR')
         
         text = os.path.basename(movie_name)
-        base_name = os.path.join(os.path.dirname(movie_name), text.split('DLC')[0])
-        video_name = f"{base_name}.avi"
-        video_nameR = f"Mirror{base_name}R.avi"
-        video_nameL = f"Mask{base_name}L.avi"
-        self.process_and_split_video(video_name, video_nameR, good_frames, head_angle, df, factor, 315, 630, faceshift=60, flip=True)
-        self.process_and_split_video(video_name, video_nameL, good_frames, head_angle, df, factor, 0, 315, faceshift=80)
+        data_path = os.path.dirname(movie_name)
+        trial_name = text.split('DLC')[0]
+        video_name = os.path.join(data_path, f"{trial_name}.avi")
+        outputs = [
+            (os.path.join(data_path, f"{region.prefix}{trial_name}{region.suffix}.avi"), region)
+            for region in (regions or TOP_VIEW_SPLIT_REGIONS)
+        ]
+        session_index = self.get_session_index(data_path)
+        if frame_source is None:
+            #RAW FRAME STORE (IF WRITTEN BY MOVIE CREATION): GOOD FRAMES READ DIRECTLY, NO DECODE OF SKIPPED FRAMES
+            frame_stores = session_index.trial_files('frame_store', int(trial_name)) if trial_name.isdigit() else []
+            frame_source = str(frame_stores[0]) if frame_stores else video_name
+        self.process_and_split_video(frame_source, outputs, good_frames, head_angle, df, factor)
+        for output_name, _ in outputs:
+            session_index.add(output_name)
+        return [output_name for output_name, _ in outputs]
+
+
+    def process_and_split_video(self, input_name: str, outputs: list[tuple[str, SplitRegion]], good_frames, head_angle, df, factor):
+        '''
+        Split engine: frames of source (video, JPEG folder; see frame_source) are read once; each good frame is
+        rotated/cropped once and every region (left, right, future ROIs) is written to its own writer in the same pass
+        '''
+        if self.debug:
+            print(f'DEBUG: ViewParsingManager::process_and_split_video - {input_name}, {[region.suffix for _, region in outputs]}')
+        import cv2
+        from src.lib.frame_source import open_frame_source
 
+        source = open_frame_source(input_name)
+        videos = [cv2.VideoWriter(output_name, 0, 40, (region.end_index - region.start_index, 700)) for output_name, region in outputs]
+        regions = [region for _, region in outputs]
 
-    def process_and_split_video(self, input_name: str, output_name: str, good_frames, head_angle, df, factor, start_index, end_index, faceshift=60, flip=False):
-        if self.debug:
-            if flip:
-                print(f'DEBUG: ViewParsingManager::process_and_split_video - {input_name}, right')
-            else:
-                print(f'DEBUG: ViewParsingManager::process_and_split_video - {input_name}, left')
-        
-        cap = cv2.VideoCapture(input_name)
-        video = cv2.VideoWriter(output_name, 0, 40, (315,700))
-        
-        i=0
-        while(cap.isOpened()):
-            ret, frame = cap.read()
-            if frame is None:
-                break
-            if ret == True:
-                i+=1
-            if len(good_frames)>i:
-                if good_frames[i-1]==1:
-                    color_coverted = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    image = Image.fromarray(color_coverted)
-                    rotated = image.rotate((math.degrees(head_angle[i])-90+180), expand=True)
-                    rotated = np.array(rotated) 
-                    rotated = rotated[:, :, ::-1].copy() 
-                    cropped=  self.crop_rotated(rotated, frame, head_angle, i, df)
-                    cropped_image = cropped[0:700, start_index+faceshift:end_index+faceshift]
-                    if flip:
-                        frame2 = cv2.flip(cropped_image, 1)
-                    else:
-                        frame2 = cropped_image
-                    frame2 = image_util.Mask(frame2,60)
-                    frame2 = Image.fromarray(frame2)
-                    frame2 = frame2.convert("RGB")
-                    enhancer = ImageEnhance.Contrast(frame2)
-                    enhanced = enhancer.enhance(factor)
-                    video.write(np.array(enhanced))
-            else:
-                break 
+        #ONLY GOOD FRAMES ARE READ (SEQUENTIAL SOURCES SKIP OTHERS WITH grab(): NO RETRIEVE/CONVERSION)
+        #N.B. frame k is rotated with head angle / DLC row k+1 and last frame is never written (unchanged from original loop)
+        good_frame_index = good_frames.frame_index[good_frames.frame_index < len(good_frames.mask) - 1]
+        for good_frame, frame in source.frames(good_frame_index):
+            for video, frame2 in zip(videos, self.split_frame(frame, head_angle, df, good_frame + 1, factor, regions)):
+                video.write(frame2)
+        for video in videos:
+            video.release()
 
-        else:
-            print("Error opening the video file")
-        video.release()
-
-
-    def crop_rotated(self, rotated: np.ndarray, frame: np.ndarray, Angle, i: int, df: pd.DataFrame):
-
-        img = Image.fromarray(rotated, 'RGB')
-        Newrotated=np.uint8(self.add_margin(img, 400, 400, 400, 400, (0,0,0)))
-        Alpharad = math.radians(math.degrees(Angle[i])-90+180)
-        P = [df.Nosey[i] ,df.Nosex[i]]
-        c, s = np.cos(Alpharad),np.sin(Alpharad)
-        RotMatrix = np.array(((c, -s), (s, c)))
-        ImCenterA = np.array(frame.shape[0:2])/2       # Center of the main image
-        ImCenterB = np.array(Newrotated.shape[0:2])/2  # Center of the transformed image
-        RotatedP =RotMatrix.dot(P-ImCenterA)+ImCenterB
-        midpoint= 350
-        sizetotal = 700
-        ratsiosize = 1.1
-        y= int(RotatedP[0]-midpoint)
-        x= int(RotatedP[1]-midpoint*ratsiosize)
-        h = sizetotal
-        w = int(sizetotal*ratsiosize)
-        crop_img = Newrotated[y:y+h, x:x+w]
-        return crop_img
-    
 
-    def add_margin(self, pil_img, top, right, bottom, left, color):
-        width, height = pil_img.size
-        new_width = width + right + left
-        new_height = height + top + bottom
-        result = Image.new(pil_img.mode, (new_width, new_height), color)
-        result.paste(pil_img, (left, top))
-        return result
-    
+    def split_frame(self, frame: np.ndarray, head_angle, df: pd.DataFrame, i: int, factor, regions: list[SplitRegion]) -> list[np.ndarray]:
+        '''
+        Rotates frame about nose (head angle i) once, crops every region window, applies mask and contrast
+        '''
+        import cv2
+        from src.lib import image_util
+        #SINGLE AFFINE WARP (ROTATION ABOUT NOSE + CROP WINDOW) OF COLUMNS SPANNING ALL REGIONS
+        col_start = min(region.start_index + region.faceshift for region in regions)
+        col_end = max(region.end_index + region.faceshift for region in regions)
+        angle = math.degrees(head_angle[i])-90+180
+        cropped = image_util.warp_split(frame, angle, (df.Nosex[i], df.Nosey[i]), col_start, col_end - col_start, 700)
+
+        frames = []
+        for region in regions:
+            start = region.start_index + region.faceshift - col_start
+            cropped_image = cropped[:, start:start + region.end_index - region.start_index]
+            if region.flip:
+                frame2 = cv2.flip(cropped_image, 1)
+            else:
+                frame2 = cropped_image
+            #MASK + CONTRAST (PIL ImageEnhance.Contrast EQUIVALENT LUT) FUSED ON ONE BUFFER
+            #UNFLIPPED REGIONS ARE (POSSIBLY OVERLAPPING) VIEWS OF cropped -> COPY
+            frames.append(image_util.mask_and_contrast(frame2, 60, factor, inplace=region.flip))
+        return frames
+
 
-    def writeFrameData_from_top_video(self, data_path):
+    def writeFrameData_from_top_video(self, data_path) -> list[dict]:
+        '''
+        FrameData of all trials -> single session table {data_path}/FrameData.parquet (or .npz; frame_data_format) keyed by trial
+        Optional legacy per-trial {trial}FrameData.xlsx (frame_data_xlsx_export); returns per-trial summary (run_trial_tasks)
+        '''
         if self.debug:
             print(f'DEBUG: ViewParsingManager::writeFrameData_from_top_video')
+        from src.lib.frame_data_writer import write_session_frame_data
+        from src.lib.tasks import frame_data_trial
+
+        #TABLES OF TRIALS COMPUTED IN 'split' PROCESS POOL (trial_workers); SESSION TABLE WRITTEN HERE, IN TRIAL ORDER
+        #KINEMATICS PARSED BY SPLIT (ANY PROCESS) ARE PASSED ON: DLC csv PARSED ONCE PER TRIAL
+        trials = self.get_session_index(data_path).trials('top_video')
+        trial_kwargs = {trial: {'trial_kinematics': self.cached_trial_kinematics(data_path, trial)} for trial in trials}
+        results = self.run_trial_tasks('writeFrameData_from_top_video', frame_data_trial, data_path, trials, trial_kwargs,
+                                       xlsx_export=self.frame_data_xlsx_export)
+        tables = {result['trial']: result['table'] for result in results}
 
-        contrastfactor=self.contrastfactor #TODO: remove variable if not used
-        text_files = [os.path.join(data_path,f) for f in os.listdir(data_path) if f.endswith('.avi') and not f.endswith('L.avi') and not f.endswith('R.avi') and not f.endswith('videopoints.avi') and not f.endswith('videopoints.avi')]
-        for trial in range(len(text_files)):
-            t =time.time()
-            df, head_angle,interbead_distance,movie_name=self.readDLCfiles(data_path, trial)
-            text = os.path.basename(movie_name)
-            good_frames = self.find_good_frames(0.7,5,200,df,interbead_distance)
-            self.writeFrameData(data_path,text,good_frames,df,head_angle)
-            #savemovies_LR(movie_name,head_angle,df,good_frames,".avi",contrastfactor) 
-            elapsed = time.time() - t 
-            video_name = (os.path.join(os.path.dirname(movie_name),text.split('DLC')[0]+".avi"))
-            print('Trial=',video_name,'Elapsed',elapsed)
+        frame_data_filename = write_session_frame_data(tables, data_path, self.frame_data_format)
+        self.get_session_index(data_path).add(frame_data_filename)
+        self.fileLogger.logevent(f"FrameData: {frame_data_filename} ({len(tables)} trial(s))".ljust(20))
+        return results
 
 
     def writeFrameData(self, data_path, text, Good_Frames, df, Angle):
-        #frame_data_path = os.path.join(data_path,text.split('DLC')[0]+'FrameData.xlsx');
-        #good_frame_id = np.where(np.array(Good_Frames) == 1)[0]
-        #results=pd.DataFrame({"goodframes":good_frame_id, "Angle":Angle[Good_Frames==1], "Nosex":df.Nosex[Good_Frames==1],"Nosey":df.Nosey[Good_Frames==1],"Snoutx":df.Snoutx1[Good_Frames==1],"Snouty":df.Snouty1[Good_Frames==1]})                     
-        #results.to_csv(frame_data_path)
-
-        frame_data_path = os.path.join(data_path,text.split('DLC')[0]+'FrameData.xlsx');
-        pos = np.where(np.array(Good_Frames) == 1)[0]
-        results=pd.DataFrame({"goodframes":pos, "Angle":Angle[Good_Frames==1], "Nosex":df.Nosex[Good_Frames==1]\
-        ,"Nosey":df.Nosey[Good_Frames==1],"Snoutx":df.Snoutx1[Good_Frames==1],"Snouty":df.Snouty1[Good_Frames==1]})                     
-        # print(results)
-
-        # Specify a writer
-        wb_target = Workbook()
-        writer = wb_target.active
-
-        rows = dataframe_to_rows(results, index=False)
-        for r_idx, row in enumerate(rows, 1):
-            for c_idx, value in enumerate(row, 1):
-                writer.cell(row=r_idx, column=c_idx, value=value)
-        wb_target.save(frame_data_path) 
-
-
-    def find_good_frames(self, Minliklihood, mindist, maxdist, df, Distance):
-        Good_Frames = [0 if df.Noselikelihood[i] <Minliklihood or df.Snoutlikelihood[i] <Minliklihood or Distance[i]<mindist or Distance[i]>maxdist else 1 for i in range(len(df.Snoutlikelihood))]
-        a=pd.Series(Good_Frames)
-        a[a==0] = np.nan
-        return a
\ No newline at end of file
+        '''
+        Returns FrameData table of trial (good frames only); writes {trial}FrameData.xlsx if frame_data_xlsx_export
+        '''
+        from src.lib.frame_data_writer import frame_data_table, get_frame_data_writer
+
+        results = frame_data_table(Good_Frames, df, Angle)
+        if self.frame_data_xlsx_export:
+            frame_data_path = os.path.join(data_path,text.split('DLC')[0]+'FrameData.xlsx')
+            get_frame_data_writer('xlsx').write(results, frame_data_path) #WRITE-ONLY (STREAMING) WORKBOOK
+            self.get_session_index(data_path).add(frame_data_path)
+        return results